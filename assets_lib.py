@@ -0,0 +1,134 @@
+"""Lazy asset loading. Run as a script to build the packed asset bundle:
+
+    python assets_lib.py
+"""
+import os, sys, json, mmap, struct, threading
+import pygame
+import atlas_lib
+
+BUNDLE_MAGIC = b"ASTB"
+BUNDLE_HEADER = struct.Struct("<4sI")  # magic, length of json index
+
+
+class AssetRegistry():
+    def __init__(self, src_dir, bundle_path=None) -> None:
+        """Images of the game, decoded the first time they are asked for and cached.
+        If bundle_path points to a bundle built by build_bundle that is newer than
+        every image, pixels come straight from the memory-mapped bundle instead of
+        decoding png files. preload() decodes groups in a background thread, e.g.
+        while the menu is shown."""
+        self.src_dir = src_dir
+        self.images_dir = os.path.join(src_dir, "images")
+        self.images = {}
+        self.atlases = {}
+        self.lock = threading.Lock()
+        self.preloader = None
+        self.bundle = None
+        self.bundle_index = {}
+        self.bundle_data_start = 0
+        if bundle_path is not None and self.bundle_is_fresh(bundle_path):
+            self.open_bundle(bundle_path)
+
+    def bundle_is_fresh(self, bundle_path):
+        if not os.path.isfile(bundle_path):
+            return False
+        bundle_time = os.path.getmtime(bundle_path)
+        for root, dirs, files in os.walk(self.images_dir):
+            for file in files:
+                if os.path.getmtime(os.path.join(root, file)) > bundle_time:
+                    return False
+        return True
+
+    def open_bundle(self, bundle_path):
+        with open(bundle_path, "rb") as f:
+            self.bundle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size = BUNDLE_HEADER.unpack_from(self.bundle)
+        if magic != BUNDLE_MAGIC:
+            self.bundle = None
+            return
+        self.bundle_index = json.loads(self.bundle[BUNDLE_HEADER.size:BUNDLE_HEADER.size + index_size])
+        self.bundle_data_start = BUNDLE_HEADER.size + index_size
+
+    def names(self, group):
+        """Names of images in a group (directory in images), without extension"""
+        if self.bundle is not None and group in self.bundle_index:
+            return sorted(self.bundle_index[group])
+        directory = os.path.join(self.images_dir, group)
+        return sorted(os.path.splitext(file)[0] for file in os.listdir(directory) if os.path.isfile(os.path.join(directory, file)))
+
+    def decode(self, group, name):
+        if self.bundle is not None and name in self.bundle_index.get(group, {}):
+            offset, width, height = self.bundle_index[group][name]
+            offset += self.bundle_data_start
+            # surface shares memory of the bundle, nothing is copied or decoded
+            image = pygame.image.frombuffer(memoryview(self.bundle)[offset:offset + width * height * 4], (width, height), "RGBA")
+        else:
+            image = pygame.image.load(os.path.join(self.images_dir, group, name + ".png"))
+        image.set_colorkey((0,0,0))
+        return image
+
+    def get(self, group, name):
+        """Returns the image, decoding it on first use"""
+        image = self.images.get((group, name))
+        if image is None:
+            with self.lock:
+                image = self.images.get((group, name))
+                if image is None:
+                    image = self.images[(group, name)] = self.decode(group, name)
+        return image
+
+    def load_group(self, group):
+        """Dict of name: image of every image in the group, like setup_lib.load_images"""
+        return {name: self.get(group, name) for name in self.names(group)}
+
+    def preload(self, groups):
+        """Starts decoding every image of groups in a background thread"""
+        def load_groups():
+            for group in groups:
+                self.load_group(group)
+        self.preloader = threading.Thread(target=load_groups, daemon=True)
+        self.preloader.start()
+
+    def atlas_groups(self, groups):
+        """Groups packed into one display-format atlas (see atlas_lib), as dict of
+        group: image dict of atlas subsurfaces. Packed once per set of groups."""
+        groups = tuple(groups)
+        if groups not in self.atlases:
+            if self.preloader is not None:
+                self.preloader.join()
+            self.atlases[groups] = atlas_lib.pack_image_dicts({group: self.load_group(group) for group in groups})[1]
+        return self.atlases[groups]
+
+    def build_bundle(self, bundle_path, groups):
+        """Writes decoded RGBA pixels of every image in groups into one file, with
+        a json index of where each image starts and its size"""
+        index = {}
+        pixels = []
+        data_size = 0
+        for group in groups:
+            index[group] = {}
+            for name in self.names(group):
+                image = pygame.image.load(os.path.join(self.images_dir, group, name + ".png"))
+                image_bytes = pygame.image.tobytes(image, "RGBA")
+                index[group][name] = [data_size, image.get_width(), image.get_height()]
+                pixels.append(image_bytes)
+                data_size += len(image_bytes)
+        # offsets in the index are relative to pixel data, which starts right after the index
+        index_bytes = json.dumps(index).encode()
+        with open(bundle_path, "wb") as f:
+            f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, len(index_bytes)))
+            f.write(index_bytes)
+            for image_bytes in pixels:
+                f.write(image_bytes)
+
+
+def main():
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    bundle_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(src_dir, "assets.bundle")
+    groups = [entry.name for entry in os.scandir(os.path.join(src_dir, "images")) if entry.is_dir()]
+    AssetRegistry(src_dir).build_bundle(bundle_path, groups)
+    print("Bundle written to", bundle_path)
+
+
+if __name__ == "__main__":
+    main()
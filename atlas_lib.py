@@ -0,0 +1,42 @@
+import pygame
+
+
+class TextureAtlas():
+    def __init__(self, images, max_width=512) -> None:
+        """Packs named surfaces (dict of name: surface) into one surface using shelf
+        packing - images sorted by height are placed in rows no wider than max_width.
+        Atlas is converted to display pixel format when a display is set, so blits
+        from it don't convert pixels. Images are then handed out as subsurfaces,
+        views sharing atlas pixels instead of copies."""
+        self.regions = {}
+        width = max([max_width] + [image.get_width() for image in images.values()])
+        shelf_x, shelf_y, shelf_height = 0, 0, 0
+        for name, image in sorted(images.items(), key=lambda item: -item[1].get_height()):
+            if shelf_x + image.get_width() > width:
+                shelf_x, shelf_y, shelf_height = 0, shelf_y + shelf_height, 0
+            self.regions[name] = pygame.Rect((shelf_x, shelf_y), image.get_size())
+            shelf_x += image.get_width()
+            shelf_height = max(shelf_height, image.get_height())
+        self.surface = pygame.Surface((width, max(shelf_y + shelf_height, 1)))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        # pixels left out by colorkey stay black, just like frames blitted onto new surfaces
+        self.surface.fill((0, 0, 0))
+        for name, image in images.items():
+            self.surface.blit(image, self.regions[name])
+
+    def get(self, name, colorkey=(0,0,0)):
+        image = self.surface.subsurface(self.regions[name])
+        image.set_colorkey(colorkey)
+        return image
+
+    def image_dict(self, group):
+        """Images packed with pack_image_dicts under group, as dict of name: subsurface"""
+        return {key[1]: self.get(key) for key in self.regions if key[0] == group}
+
+
+def pack_image_dicts(image_dicts, max_width=512):
+    """Packs several dicts of images, e.g. {"tiles": {...}, "player": {...}} into one atlas.
+    Returns the atlas and the same structure of dicts with subsurfaces of the atlas."""
+    atlas = TextureAtlas({(group, name): image for group, images in image_dicts.items() for name, image in images.items()}, max_width)
+    return atlas, {group: atlas.image_dict(group) for group in image_dicts}
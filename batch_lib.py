@@ -0,0 +1,110 @@
+"""Runs many independent seeded game sessions at once, spread over a pool of
+processes, each without a window or sound. Every run reports its own metrics,
+the batch reports steps per second of all runs together, e.g.:
+
+    python batch_lib.py --runs 200 --ticks 3600 --inputs right jump --output batch.json
+"""
+import os, sys, json, time, argparse, multiprocessing
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+# SDL would turn SIGTERM into a quit event, so workers wouldn't stop when the pool terminates them
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+import pygame
+import assets_lib, replay_lib, headless
+
+# Per process state of a pool worker, set up once by init_worker
+worker_state = {}
+
+
+def init_worker(src_dir):
+    """Runs once in every worker process; images are loaded once per process
+    and shared by all the worlds it simulates"""
+    pygame.init()
+    worker_state["src_dir"] = src_dir
+    worker_state["assets"] = assets_lib.AssetRegistry(src_dir)
+    worker_state["input_logs"] = {}
+
+
+def make_job(seed, ticks, enemies=1, inputs=(), replay="", level_file=""):
+    """Description of one run: held inputs (names from replay_lib.INPUT_NAMES)
+    are pressed for the whole run, unless replay names an input log to play back"""
+    return {"seed": seed, "ticks": ticks, "enemies": enemies, "inputs": list(inputs), "replay": replay, "level_file": level_file}
+
+
+def run_job(job):
+    """Simulates one world and returns its metrics; called in a worker process"""
+    if not worker_state:
+        init_worker(os.path.dirname(os.path.realpath(__file__)))
+    world = headless.make_world(worker_state["src_dir"], job["seed"], job["level_file"], job["enemies"], worker_state["assets"])
+    if job["replay"]:
+        if job["replay"] not in worker_state["input_logs"]:
+            worker_state["input_logs"][job["replay"]] = replay_lib.InputLog.load(job["replay"])
+        input_log = worker_state["input_logs"][job["replay"]]
+    else:
+        input_log = None
+    held_mask = replay_lib.pack_inputs({name: name in job["inputs"] for name in replay_lib.INPUT_NAMES})
+    player = world.player
+    start_x = player.rect.x
+    max_distance = 0
+    enemy_contact_ticks = 0
+    started = time.perf_counter()
+    for tick in range(job["ticks"]):
+        world.tick(input_log.mask_at(tick) if input_log is not None else held_mask)
+        max_distance = max(max_distance, abs(player.rect.x - start_x))
+        if any(obj is not player for obj in world.entity_hash.query_rect(player.rect)):
+            enemy_contact_ticks += 1
+    elapsed = time.perf_counter() - started
+    world.level.close()
+    return headless.add_chunk_stats({"seed": job["seed"], "ticks": job["ticks"], "state_hash": world.state_hash(), "seconds": elapsed,
+                                     "player_x": float(player.pos_x), "player_y": float(player.pos_y), "max_distance": int(max_distance),
+                                     "enemy_contact_ticks": enemy_contact_ticks, "pid": os.getpid()}, world.level)
+
+
+def run_batch(jobs, src_dir=None, processes=None):
+    """Runs every job in a pool of processes (one per core by default) and returns
+    results of runs in the order of jobs, with totals of the whole batch. Workers
+    are started fresh (spawn), so no pygame or thread state is inherited."""
+    src_dir = src_dir or os.path.dirname(os.path.realpath(__file__))
+    processes = processes or os.cpu_count() or 1
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    with context.Pool(processes, initializer=init_worker, initargs=(src_dir,)) as pool:
+        runs = pool.map(run_job, jobs, chunksize=1)
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - started
+    total_ticks = sum(run["ticks"] for run in runs)
+    return {"processes": processes, "runs": runs, "total_ticks": total_ticks, "seconds": elapsed,
+            "ticks_per_second": total_ticks / elapsed if elapsed else 0.0,
+            # speed of a single process while simulating; ticks_per_second divided by it shows how the pool scales
+            "ticks_per_second_per_process": total_ticks / sum(run["seconds"] for run in runs) if runs else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=8, help="runs with seeds first_seed, first_seed + 1, ...")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--inputs", nargs="*", default=[], choices=replay_lib.INPUT_NAMES, help="inputs held during runs")
+    parser.add_argument("--replay", default="", help="input log to play back in every run instead of held inputs")
+    parser.add_argument("--level", default="", help="level file from levels directory; infinite level if not given")
+    parser.add_argument("--processes", type=int, help="worker processes; one per core if not given")
+    parser.add_argument("--output", help="JSON file to write all results to; only totals are printed")
+    args = parser.parse_args()
+
+    jobs = [make_job(seed, args.ticks, args.enemies, args.inputs, args.replay, args.level)
+            for seed in range(args.first_seed, args.first_seed + args.runs)]
+    results = run_batch(jobs, processes=args.processes)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    summary = {key: value for key, value in results.items() if key != "runs"}
+    summary["run_count"] = len(results["runs"])
+    json.dump(summary, sys.stdout, indent=4)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Benchmark of the frame pipeline. Runs scripted scenarios headless with fixed
+seeds and measures every stage of a frame separately: chunk generation,
+collisions, animation, tile blitting, entity blitting and upscaling to the window.
+Results are written as JSON, so runs on different commits can be compared:
+
+    python benchmark.py --ticks 600 --output bench.json
+
+With --startup it also measures time from launching the game to its first frame,
+with --memory memory taken by enemies, as separate entities and as a swarm.
+"""
+import os, sys, json, time, shutil, argparse, platform, tempfile, subprocess, tracemalloc
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame, numpy
+import camera_lib, assets_lib, replay_lib, render_lib, entity, headless
+
+#Inputs held during the whole scenario and number of enemies in it
+SCENARIOS = {
+    "idle": ({}, 1),
+    "run_right": ({"right": True}, 1),
+    "fly_diagonal": ({"fly_mode": True, "right": True, "squat": True}, 1),
+    "swarm": ({}, 500),
+}
+STAGES = ["chunk_generation", "collision", "animate", "tile_blitting", "entity_blitting", "upscale"]
+
+
+def stage_stats(samples):
+    samples = numpy.array(samples) * 1000
+    return {"mean_ms": float(samples.mean()), "p50_ms": float(numpy.percentile(samples, 50)),
+            "p95_ms": float(numpy.percentile(samples, 95)), "max_ms": float(samples.max()),
+            "total_ms": float(samples.sum())}
+
+
+def run_scenario(src_dir, window, tile_images, held_inputs, enemy_count, ticks, seed, scale_method="integer"):
+    """Runs one frame per tick and returns timing stats of every stage"""
+    world = headless.make_world(src_dir, seed, enemy_count=enemy_count)
+    level = world.level
+    canvas = pygame.Surface((window.get_width() // 4, window.get_height() // 4))
+    upscaler = render_lib.Upscaler(canvas, window, scale_method)
+    camera = camera_lib.Camera()
+    inputs = {name: False for name in replay_lib.INPUT_NAMES}
+    inputs.update(held_inputs)
+    input_mask = replay_lib.pack_inputs(inputs)
+    timings = {stage: [] for stage in STAGES}
+
+    def timed(stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[stage].append(time.perf_counter() - started)
+        return result
+
+    def generate_visible_chunks():
+        # chunks are generated right here instead of the worker pool, so the stage can be measured
+        first_x, first_y, count_x, count_y = level.visible_chunks_range(canvas, camera)
+        for chunk_y in range(first_y, first_y + count_y):
+            for chunk_x in range(first_x, first_x + count_x):
+                level.get_chunk(chunk_x, chunk_y)
+
+    def draw_entities():
+        canvas.blit(world.player.sprite, camera.player_pos)
+        world.enemies.draw(canvas, camera)
+
+    for tick in range(ticks):
+        replay_lib.unpack_inputs(input_mask, world.player.inputs)
+        timed("collision", world.update_entities)
+        timed("animate", world.animate_entities)
+        world.tick_count += 1
+        camera.update(world.player, canvas.get_size(), level.level_size)
+        timed("chunk_generation", generate_visible_chunks)
+        canvas.fill((100, 100, 255))
+        timed("tile_blitting", level.load_chunks, canvas, camera, tile_images)
+        timed("entity_blitting", draw_entities)
+        timed("upscale", upscaler.present)
+    level.close()
+    frame_times = numpy.sum([timings[stage] for stage in STAGES], axis=0)
+    result = {stage: stage_stats(samples) for stage, samples in timings.items()}
+    result["frame"] = stage_stats(frame_times)
+    result["state_hash"] = world.state_hash()
+    return headless.add_chunk_stats(result, level)
+
+
+# Started in a fresh interpreter; shows the menu until a timer quits it and prints when the first frame was shown
+STARTUP_SCRIPT = """
+import sys, pygame, game_lib
+game = game_lib.Game()
+game.setup(sys.argv[1])
+pygame.init()
+pygame.time.set_timer(pygame.QUIT, 300, 1)
+game.menu()
+print(game.first_frame_time)
+"""
+
+
+def measure_startup(src_dir, runs):
+    """Time from launching python to the first menu frame being shown, in ms.
+    Uses perf_counter of both processes, which is a system wide clock. The game
+    writes its settings on startup, so it gets a copy of them instead of settings.json."""
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    samples = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        settings_path = os.path.join(temp_dir, "settings.json")
+        if os.path.isfile(os.path.join(src_dir, "settings.json")):
+            shutil.copyfile(os.path.join(src_dir, "settings.json"), settings_path)
+        for run in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, settings_path], cwd=src_dir, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(float(output.split()[-1]) - start)
+    samples = numpy.array(samples) * 1000
+    return {"runs": runs, "p50_ms": float(numpy.percentile(samples, 50)), "min_ms": float(samples.min()),
+            "max_ms": float(samples.max())}
+
+
+def measure_memory(src_dir, count):
+    """Memory allocated for count Enemy entities and for a swarm of count enemies.
+    Frames are shared by all of them, so they are sliced before measuring."""
+    images = assets_lib.AssetRegistry(src_dir).atlas_groups(("enemy",))["enemy"]
+    entity.Enemy((0, 0), images, frame_size=(32, 32)).setup_animations()
+    tracemalloc.start()
+    started = tracemalloc.get_traced_memory()[0]
+    enemies = [entity.Enemy((i, 0), images, frame_size=(32, 32)) for i in range(count)]
+    for enemy in enemies:
+        enemy.setup_animations()
+    entities_bytes = tracemalloc.get_traced_memory()[0] - started
+    del enemies
+    started = tracemalloc.get_traced_memory()[0]
+    swarm = entity.EnemySwarm(images, frame_size=(32, 32))
+    for i in range(count):
+        swarm.spawn((i, 0))
+    swarm_bytes = tracemalloc.get_traced_memory()[0] - started
+    tracemalloc.stop()
+    return {"count": count, "entity_bytes_per_enemy": entities_bytes / count, "swarm_bytes_per_enemy": swarm_bytes / count}
+
+
+def git_commit(src_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=src_dir, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--enemies", type=int, default=SCENARIOS["swarm"][1], help="enemies in the swarm scenario")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--scale-method", default="integer", choices=render_lib.SCALE_METHODS)
+    parser.add_argument("--startup", type=int, default=0, metavar="RUNS", help="also measure time to first frame over RUNS launches")
+    parser.add_argument("--memory", type=int, default=0, metavar="COUNT", help="also measure memory taken by COUNT enemies")
+    parser.add_argument("--output", help="JSON file to write results to; printed if not given")
+    args = parser.parse_args()
+
+    pygame.init()
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    window = pygame.display.set_mode((1600, 900))
+    tile_images = assets_lib.AssetRegistry(src_dir).atlas_groups(("tiles",))["tiles"]
+    results = {"commit": git_commit(src_dir), "python": platform.python_version(), "pygame": pygame.version.ver,
+               "ticks": args.ticks, "seed": args.seed, "scale_method": args.scale_method, "scenarios": {}}
+    for name in args.scenarios:
+        held_inputs, enemy_count = SCENARIOS[name]
+        if name == "swarm":
+            enemy_count = args.enemies
+        results["scenarios"][name] = run_scenario(src_dir, window, tile_images, held_inputs, enemy_count, args.ticks, args.seed, args.scale_method)
+    if args.startup:
+        results["startup"] = measure_startup(src_dir, args.startup)
+    if args.memory:
+        results["memory"] = measure_memory(src_dir, args.memory)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+
+
+if __name__ == "__main__":
+    main()
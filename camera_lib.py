@@ -1,22 +1,46 @@
-import pygame
+import math, pygame
 
 
 class Camera:
-    def __init__(self):
+    def __init__(self, margin=32):
         self.x = 0
         self.y = 0
         self.player_pos = [0, 0]
+        # Part of the world on screen, in whole pixels; set by update
+        self.view_rect = pygame.Rect(0, 0, 0, 0)
+        # How far outside the view things still count as visible, so they are ready when they come in
+        self.margin = margin
+        # Tracked object: its rect in world coordinates
         self.tracked_objects = {}
 
-    def track_surf(self, surface):
-        """Adds an object to list of tracked objects with its position.
-        This may be later used to update positions of all objects and
-        iterate through them to draw them onto screen."""
-        surface_x = self.x + surface.get_rect().x
-        surface_y = self.y + surface.get_rect().y
-        self.objects[surface] = (surface_x, surface_y)
+    def track(self, obj):
+        """Adds an object with a rect (e.g. an entity) to tracked objects. Its rect is
+        kept by reference, so the object can move without being tracked again."""
+        self.tracked_objects[obj] = obj.rect
 
-    def eval_player_pos(self, vertical_equator, horizontal_equator, player, max_x, max_y):
+    def track_surf(self, surface, pos=(0, 0)):
+        """Adds a surface to tracked objects, placed at pos on the screen as
+        the camera is now, i.e. at pos plus camera coordinates in the world."""
+        self.tracked_objects[surface] = pygame.Rect(self.view_rect.x + pos[0], self.view_rect.y + pos[1], *surface.get_size())
+
+    def untrack(self, obj):
+        self.tracked_objects.pop(obj, None)
+
+    def view(self, margin=None):
+        """View rect grown by margin on each side, camera's margin by default"""
+        if margin is None:
+            margin = self.margin
+        return self.view_rect.inflate(margin * 2, margin * 2)
+
+    def is_visible(self, rect, margin=None):
+        return self.view(margin).colliderect(rect)
+
+    def visible_objects(self, margin=None):
+        """Tracked objects that are within the view and margin"""
+        view = self.view(margin)
+        return [obj for obj, rect in self.tracked_objects.items() if view.colliderect(rect)]
+
+    def eval_player_pos(self, vertical_equator, horizontal_equator, player_rect, max_x, max_y):
         """Evaluates player position - always in the middle of screen, so half
         of the screen size further than camera until they are close to the world's
         edge. The camera.player_pos is then equal to player.rect coordinates,
@@ -29,23 +53,25 @@ class Camera:
         if self.x > 0 and self.x < max_x:
             self.player_pos[0] = vertical_equator
         elif self.x == max_x:
-            self.player_pos[0] = player.rect.x - self.x
+            self.player_pos[0] = player_rect.x - self.x
         else:
-            self.player_pos[0] = player.rect.x
+            self.player_pos[0] = player_rect.x
         #same as above.
         if self.y > 0 and self.y < max_y:
             self.player_pos[1] = horizontal_equator
         elif self.y == max_y:
-            self.player_pos[1] = player.rect.y - self.y
+            self.player_pos[1] = player_rect.y - self.y
         else:
-            self.player_pos[1] = player.rect.y
+            self.player_pos[1] = player_rect.y
 
-    def update(self, player, surface_size, level_size=0):
+    def update(self, player, surface_size, level_size=0, alpha=1.0):
         """Updates camera position which is used to calculate
         where to blit all the surfaces we want to draw onto our
         game canvas. Player stays in the middle of the screen,
         unless they are close to worlds's edge. All the other surfaces
-        are placed with offset equaling to camera's coordinates"""
+        are placed with offset equaling to camera's coordinates.
+        Alpha places player between its last two simulated positions."""
+        player_rect = player.interpolated_rect(alpha)
         #Size of a player and finding central lines on screen for player, 
         # taking player's size into account 
         player_width, player_height = (
@@ -57,8 +83,8 @@ class Camera:
         
         if level_size == 0:
             #For infinite level size
-            self.x = player.rect.x - vertical_equator
-            self.y = player.rect.y - horizontal_equator
+            self.x = player_rect.x - vertical_equator
+            self.y = player_rect.y - horizontal_equator
             self.player_pos[0] = vertical_equator
             self.player_pos[1] = horizontal_equator
         else:
@@ -71,9 +97,10 @@ class Camera:
             camera_y_max = max(0, level_size[1] - surface_size[1])
             # calculating camera and player positions
             self.x = min(
-                max(player.rect.x - vertical_equator, 0), camera_x_max
+                max(player_rect.x - vertical_equator, 0), camera_x_max
             )
             self.y = min(
-                max(player.rect.y - horizontal_equator, 0), camera_y_max
+                max(player_rect.y - horizontal_equator, 0), camera_y_max
             )
-            self.eval_player_pos(vertical_equator, horizontal_equator, player, camera_x_max, camera_y_max)
+            self.eval_player_pos(vertical_equator, horizontal_equator, player_rect, camera_x_max, camera_y_max)
+        self.view_rect.update(math.floor(self.x), math.floor(self.y), surface_size[0], surface_size[1])
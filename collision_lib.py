@@ -0,0 +1,141 @@
+import math, pygame, numpy
+
+class CollisionGrid():
+    def __init__(self, tile_size=16) -> None:
+        """Persistent collision index of the level. Every solid tile is stored as a
+        pygame.Rect under its integer tile coordinates, so finding tiles touching
+        a rect only needs a look at the few cells the rect overlaps."""
+        self.tile_size = tile_size
+        self.cells = {}
+
+    def add_tile(self, tile_x, tile_y):
+        self.cells[(tile_x, tile_y)] = pygame.Rect(tile_x*self.tile_size, tile_y*self.tile_size, self.tile_size, self.tile_size)
+
+    def remove_tile(self, tile_x, tile_y):
+        self.cells.pop((tile_x, tile_y), None)
+
+    def is_solid(self, tile_x, tile_y):
+        return (tile_x, tile_y) in self.cells
+
+    def solid_at(self, tiles_x, tiles_y):
+        """Batch version of is_solid - takes arrays of tile coordinates and
+        returns boolean array"""
+        cells = self.cells
+        # entities crowd around the same tiles, so every distinct tile is looked up once
+        keys = (numpy.asarray(tiles_x, dtype=numpy.int64) << 32) + (numpy.asarray(tiles_y, dtype=numpy.int64) + 2**31)
+        keys, inverse = numpy.unique(keys, return_inverse=True)
+        solid = numpy.array([(tile_x, tile_y) in cells for tile_x, tile_y in zip((keys >> 32).tolist(), ((keys & 0xffffffff) - 2**31).tolist())], dtype=bool)
+        return solid[inverse].reshape(numpy.shape(tiles_x))
+
+    def query(self, rect):
+        """Returns list of tile rects from every cell overlapped by rect"""
+        collisions = []
+        first_x = rect.left // self.tile_size
+        last_x = (rect.right - 1) // self.tile_size
+        first_y = rect.top // self.tile_size
+        last_y = (rect.bottom - 1) // self.tile_size
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                tile = self.cells.get((tile_x, tile_y))
+                if tile is not None:
+                    collisions.append(tile)
+        return collisions
+
+
+class TileMapGrid():
+    def __init__(self, solid, tile_size=16) -> None:
+        """Collision index of a finite level - a boolean array indexed [y, x] telling
+        which tiles are solid. Rects are only created for tiles found by a query,
+        so even huge levels are indexed instantly."""
+        self.solid = solid
+        self.tile_size = tile_size
+
+    def is_solid(self, tile_x, tile_y):
+        return 0 <= tile_y < self.solid.shape[0] and 0 <= tile_x < self.solid.shape[1] and bool(self.solid[tile_y, tile_x])
+
+    def solid_at(self, tiles_x, tiles_y):
+        """Batch version of is_solid - takes arrays of tile coordinates and
+        returns boolean array; tiles outside of the level aren't solid"""
+        inside = (tiles_x >= 0) & (tiles_x < self.solid.shape[1]) & (tiles_y >= 0) & (tiles_y < self.solid.shape[0])
+        solid = numpy.zeros(tiles_x.shape, dtype=bool)
+        solid[inside] = self.solid[tiles_y[inside], tiles_x[inside]]
+        return solid
+
+    def query(self, rect):
+        """Returns list of tile rects from every cell overlapped by rect"""
+        collisions = []
+        first_x = max(rect.left // self.tile_size, 0)
+        last_x = min((rect.right - 1) // self.tile_size, self.solid.shape[1] - 1)
+        first_y = max(rect.top // self.tile_size, 0)
+        last_y = min((rect.bottom - 1) // self.tile_size, self.solid.shape[0] - 1)
+        if first_x > last_x or first_y > last_y:
+            return collisions
+        cells = self.solid[first_y:last_y + 1, first_x:last_x + 1].tolist()
+        for y_pos, row in enumerate(cells):
+            for x_pos, is_solid in enumerate(row):
+                if is_solid:
+                    collisions.append(pygame.Rect((first_x + x_pos)*self.tile_size, (first_y + y_pos)*self.tile_size, self.tile_size, self.tile_size))
+        return collisions
+
+
+def sweep(grid, rect, dx, dy):
+    """Swept AABB test of rect moving by (dx, dy) against solid tiles of grid (either
+    of the grids above). Walks the tile grid along the motion one tile border at a time,
+    DDA style, and only looks at tiles the rect's leading edges enter, so the cost
+    depends on how many tiles are crossed, not on speed or on how many tiles are near.
+    Returns (time, normal): fraction of the motion that can be done before touching
+    a solid tile, 1.0 if none is hit, and normal of the side that was hit, e.g.
+    (-1, 0) for a tile on the right. Tiles the rect already overlaps are ignored."""
+    size = grid.tile_size
+    step_x = (dx > 0) - (dx < 0)
+    step_y = (dy > 0) - (dy < 0)
+    # lead_x/lead_y: last column/row the rect reaches in the direction of motion;
+    # time_x/time_y: when its leading edge crosses into the next one
+    if step_x > 0:
+        lead_x = (rect.right - 1) // size
+        time_x = ((lead_x + 1) * size - rect.right) / dx
+    elif step_x < 0:
+        lead_x = rect.left // size
+        time_x = (lead_x * size - rect.left) / dx
+    else:
+        lead_x, time_x = 0, math.inf
+    if step_y > 0:
+        lead_y = (rect.bottom - 1) // size
+        time_y = ((lead_y + 1) * size - rect.bottom) / dy
+    elif step_y < 0:
+        lead_y = rect.top // size
+        time_y = (lead_y * size - rect.top) / dy
+    else:
+        lead_y, time_y = 0, math.inf
+    delta_x = size / abs(dx) if dx else math.inf
+    delta_y = size / abs(dy) if dy else math.inf
+
+    while min(time_x, time_y) < 1:
+        if time_x <= time_y:
+            time = time_x
+            lead_x += step_x
+            # rows the rect spans at that moment; a row entered at the same time counts
+            if step_y > 0:
+                rows = range(math.floor((rect.top + dy * time) / size), lead_y + 1)
+            elif step_y < 0:
+                rows = range(lead_y, math.ceil((rect.bottom + dy * time) / size))
+            else:
+                rows = range(rect.top // size, (rect.bottom - 1) // size + 1)
+            for tile_y in rows:
+                if grid.is_solid(lead_x, tile_y):
+                    return time, (-step_x, 0)
+            time_x += delta_x
+        else:
+            time = time_y
+            lead_y += step_y
+            if step_x > 0:
+                columns = range(math.floor((rect.left + dx * time) / size), lead_x + 1)
+            elif step_x < 0:
+                columns = range(lead_x, math.ceil((rect.right + dx * time) / size))
+            else:
+                columns = range(rect.left // size, (rect.right - 1) // size + 1)
+            for tile_x in columns:
+                if grid.is_solid(tile_x, lead_y):
+                    return time, (0, -step_y)
+            time_y += delta_y
+    return 1.0, (0, 0)
@@ -1,19 +1,36 @@
 import math, numpy
-import pygame, spritesheet
+import pygame, spritesheet, collision_lib
+
+# Bits of Entity.collisions, one for every side touching a solid tile after the last move
+COLLIDE_TOP = 1
+COLLIDE_BOTTOM = 2
+COLLIDE_RIGHT = 4
+COLLIDE_LEFT = 8
+
+# Animation frames shared by every entity with the same sheets, see AnimatedEntity.setup_animations
+animation_cache = {}
+
 
 class Entity():
+    __slots__ = ("sprite", "rect", "pos_x", "pos_y", "previous_x", "previous_y", "sounds", "physics", "speed",
+                 "x_movement", "y_movement", "jump_ability", "momentum", "g_force", "collisions", "spatial_hash")
+
     def __init__(self, pos, sprite_sheet, speed=2, colorkey=(0,0,0)) -> None:
         """Create an Entity object, consisting of
         pygame.Surface, pygame.Rects, sprite_sheet and all the variables
-        used by physics engine"""
+        used by physics engine. Entities have slots instead of a __dict__,
+        so many of them take little memory."""
         # Pygame surf and rect object setup
         self.sprite = sprite_sheet["idle"]
         self.sprite.set_colorkey(colorkey)
         self.rect = self.sprite.get_rect()
-        #Where is object in the game world
-        self.rect.x, self.rect.y = pos[0], pos[1]
-        #Sounds
-        self.sounds = {}
+        #Where is object in the game world; rect is the whole pixel the float position is in
+        self.pos_x, self.pos_y = float(pos[0]), float(pos[1])
+        self.rect.x, self.rect.y = math.floor(self.pos_x), math.floor(self.pos_y)
+        # Position before the last simulation tick, used to interpolate rendering
+        self.previous_x, self.previous_y = self.rect.x, self.rect.y
+        #Sounds; entities that make any get a dict of them
+        self.sounds = None
         # Physics and render engine variables
         self.physics = True
         self.speed = speed
@@ -22,71 +39,122 @@ class Entity():
         self.jump_ability = 0
         self.momentum = 0
         self.g_force = 0.14
+        # COLLIDE_* bits
+        self.collisions = 0
+        # Broad phase the entity is registered in, see register()
+        self.spatial_hash = None
+
+    def register(self, spatial_hash):
+        """Adds entity to a spatial_lib.SpatialHash, which is then kept up to date
+        every time the entity moves"""
+        self.spatial_hash = spatial_hash
+        spatial_hash.insert(self)
+
+    def unregister(self):
+        if self.spatial_hash is not None:
+            self.spatial_hash.remove(self)
+            self.spatial_hash = None
+
+    def interpolated_rect(self, alpha):
+        """Copy of entity rect placed alpha of the way from its position before
+        the last tick to the current position"""
+        rect = self.rect.copy()
+        rect.x = self.previous_x + (self.rect.x - self.previous_x) * alpha
+        rect.y = self.previous_y + (self.rect.y - self.previous_y) * alpha
+        return rect
 
-    def collision_test(self, tiles):
-        """For every tile in the list of rects passed as an argument,
-        run a pygame func checking if it collides with entity rect
-        and if it does, add it to the list and return the list"""
-        collisions = []
-        for tile in tiles:
-            if self.rect.colliderect(tile):
-                collisions.append(tile)
-        return collisions
+    def set_pos(self, x, y):
+        """Moves entity to x, y, keeping rect in sync with the float position"""
+        self.pos_x, self.pos_y = float(x), float(y)
+        self.rect.x, self.rect.y = math.floor(self.pos_x), math.floor(self.pos_y)
+
+    def collision_test(self, collision_grid):
+        """Look up only the cells of collision grid that entity rect overlaps
+        and return the list of tile rects found there"""
+        return collision_grid.query(self.rect)
 
     def eval_movement(self):
         self.x_movement = 0
         self.momentum = min(3, self.momentum + self.g_force)
         self.y_movement = self.momentum
 
-    def move_and_collide(self, tile_rects):
+    def move_and_collide(self, collision_grid):
+        """Moves entity one axis at a time. Float position keeps fractions of
+        pixels, the rect follows the pixel it's in. Rect is swept along the
+        movement (see collision_lib.sweep) and stops against the first solid tile
+        in the way, so fast entities can't pass through tiles."""
         # reset collision that player has with environment
-        self.collision_types = {"top": False, "bottom": False, "right": False, "left": False}
-        
-        # Calculates player's x coordinate and overwrites it in case the new value would
-        # push a player into a physical tile
-        self.rect.x += self.x_movement
-        # Runs a collision test; calls pygame collision func over player and every tile
-        for tile in self.collision_test(tile_rects):
-            if self.x_movement > 0:
-                self.rect.right = tile.left
-                self.collision_types["right"] = True
-            if self.x_movement < 0:
-                self.rect.left = tile.right
-                self.collision_types["left"] = True
-
-        # Calculates entity's y coordinate and overwrites it in case the new value would
-        # push a entity into a physical tile
-        self.rect.y += self.y_movement
-        # collision_test ran again to check for collisions after establishing x value, to calculate y value
-        for tile in self.collision_test(tile_rects):
-            if self.y_movement > 0:
-                self.rect.bottom = tile.top
+        self.collisions = 0
+
+        target_x = self.pos_x + self.x_movement
+        move_x = math.floor(target_x) - self.rect.x
+        time, normal_x, normal_y = self.sweep(collision_grid, move_x, 0)
+        if time < 1:
+            # stops touching the tile that was hit, without any fraction left
+            self.rect.x += round(move_x * time)
+            self.pos_x = self.rect.x
+            self.collisions |= COLLIDE_RIGHT if normal_x < 0 else COLLIDE_LEFT
+        else:
+            self.pos_x = target_x
+            self.rect.x += move_x
+
+        # Same for y, starting where x movement ended
+        target_y = self.pos_y + self.y_movement
+        move_y = math.floor(target_y) - self.rect.y
+        time, normal_x, normal_y = self.sweep(collision_grid, 0, move_y)
+        if time < 1:
+            self.rect.y += round(move_y * time)
+            self.pos_y = self.rect.y
+            if normal_y < 0:
                 if self.jump_ability == 0:
                     self.momentum = 0
                     self.jump_ability = 1
-                self.collision_types["bottom"] = True
-            if self.y_movement < 0:
-                self.rect.top = tile.bottom
+                self.collisions |= COLLIDE_BOTTOM
+            else:
                 self.momentum = 0
-                self.collision_types["top"] = True
+                self.collisions |= COLLIDE_TOP
+        else:
+            self.pos_y = target_y
+            self.rect.y += move_y
+
+    def sweep(self, collision_grid, move_x, move_y):
+        """collision_lib.sweep of the rect, as time, normal x and normal y"""
+        if move_x == 0 and move_y == 0:
+            return 1.0, 0, 0
+        time, (normal_x, normal_y) = collision_lib.sweep(collision_grid, self.rect, move_x, move_y)
+        return time, normal_x, normal_y
+
+    def clamp_to_level_edge(self, level_size):
+        """In case entity gets to the edge of the world/level, clamp its position
+        to said edge"""
+        self.set_pos(min(max(self.pos_x, 0), level_size[0] - self.rect.width),
+                     min(max(self.pos_y, 0), level_size[1] - self.rect.height))
 
     def update(self, **kwargs) -> None:
         """Updates state of the entity. Calls eval_movement to update how the
         entity should move according to inputs and physics. Adds the values calculated
         in eval_movement for one axis at a time and applies collisions. First checks
         movement and collisions in one axis, then in the other."""
+        self.previous_x, self.previous_y = self.rect.x, self.rect.y
         # calculate movement
         self.eval_movement() 
 
         #Update entity's position and check collisions
-        self.move_and_collide(kwargs["tile_rects"])
+        self.move_and_collide(kwargs["collision_grid"])
 
         # Screen edge collisions
         if kwargs["level_size"] != 0:
-            self.clamp_to_level_edge(kwargs["tile_rects"])
+            self.clamp_to_level_edge(kwargs["level_size"])
+
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(self)
 
     
 class AnimatedEntity(Entity):
+    __slots__ = ("init_pos", "sheet_size", "frame_size", "animation_keys", "colorkey", "animations", "active_animation",
+                 "previous_animation", "frame_index", "frame_timer", "flip_x", "flip_y", "oriented_animations",
+                 "shown_animation", "shown_frame_index", "shown_flip_x", "shown_flip_y")
+
     def __init__(self, pos, sprite_sheet, speed=2, colorkey=(0,0,0), sheet_size=(32,32), frame_size=(16,16)) -> None:
         super().__init__(pos, sprite_sheet, speed, colorkey)
         self.init_pos = pos
@@ -95,24 +163,45 @@ class AnimatedEntity(Entity):
         self.frame_size = frame_size
         self.animation_keys = sprite_sheet
         self.colorkey = colorkey
-        self.animations = {}
+        self.animations = None
         self.active_animation = None
         self.previous_animation = None
         self.frame_index = 0
         self.frame_timer = 0
-        self.flip = [False, False]
+        self.flip_x = False
+        self.flip_y = False
+        # Frames of every animation in every orientation, indexed [flip x][flip y][animation]
+        self.oriented_animations = None
+        # What the sprite shows now; it's only replaced when one of these changes
+        self.shown_animation = None
+        self.shown_frame_index = -1
+        self.shown_flip_x = False
+        self.shown_flip_y = False
 
     def setup_animations(self):
-        for key, value in self.animation_keys.items():
-            frames = spritesheet.Spritesheet(value, self.sheet_size, self.frame_size).get_frames()
-            for frame in frames:
-                frame.set_colorkey(self.colorkey)
-            self.animations[key] = frames
+        """Takes frames of sprite sheets and their mirrored copies, so animate never
+        has to flip surfaces. Sheets are sliced once and the resulting dicts of
+        animations are shared by every entity using the same sheets."""
+        cache_key = (tuple(self.animation_keys.items()), tuple(self.sheet_size), tuple(self.frame_size), tuple(self.colorkey))
+        if cache_key not in animation_cache:
+            animations = {}
+            oriented_animations = [[{}, {}], [{}, {}]]
+            for key, value in self.animation_keys.items():
+                sheet = spritesheet.get_sheet(value, self.sheet_size, self.frame_size)
+                frames = sheet.get_frames()
+                for frame in frames:
+                    frame.set_colorkey(self.colorkey)
+                animations[key] = frames
+                oriented = sheet.oriented_frames(self.colorkey)
+                for flip_x in (False, True):
+                    for flip_y in (False, True):
+                        oriented_animations[flip_x][flip_y][key] = oriented[flip_x][flip_y]
+            animation_cache[cache_key] = (animations, oriented_animations)
+        self.animations, self.oriented_animations = animation_cache[cache_key]
         self.sprite = self.animations["idle"][0]
-        self.sprite.set_colorkey(self.colorkey)
         self.rect = self.sprite.get_rect()
-        self.rect.x = self.init_pos[0]
-        self.rect.y = self.init_pos[1]
+        self.set_pos(self.init_pos[0], self.init_pos[1])
+        self.previous_x, self.previous_y = self.rect.x, self.rect.y
     
     def animate(self):
         """Checks any changes in active animation, updates the state of
@@ -137,13 +226,16 @@ class AnimatedEntity(Entity):
             self.frame_timer = 7
         self.frame_timer -= 1
 
-        self.sprite = self.animations[self.active_animation][self.frame_index]
         #Handling horizontal and vertical mirroring
-        if self.x_movement < 0:
-            self.flip[0] = True
-        else:
-            self.flip[0] = False
-        self.sprite = pygame.transform.flip(self.sprite, self.flip[0], self.flip[1])
+        self.flip_x = self.x_movement < 0
+        # Sprite only changes when frame or orientation does; frames are already flipped
+        if (self.active_animation != self.shown_animation or self.frame_index != self.shown_frame_index
+                or self.flip_x != self.shown_flip_x or self.flip_y != self.shown_flip_y):
+            self.sprite = self.oriented_animations[self.flip_x][self.flip_y][self.active_animation][self.frame_index]
+            self.shown_animation = self.active_animation
+            self.shown_frame_index = self.frame_index
+            self.shown_flip_x = self.flip_x
+            self.shown_flip_y = self.flip_y
         self.previous_animation = self.active_animation
 
     def update(self, **kwargs) -> None:
@@ -151,42 +243,14 @@ class AnimatedEntity(Entity):
 
 
 class Player(AnimatedEntity):
+    __slots__ = ("inputs",)
+
     def __init__(self, pos, sprite_sheet, speed=2, colorkey=(0,0,0), sheet_size=(32,32), frame_size=(16,16)) -> None:
         super().__init__(pos, sprite_sheet, speed, colorkey, sheet_size, frame_size)
+        # set every tick from an input mask, made from key events by input_lib or replayed
         self.inputs = {"jump": False, "squat": False, "left": False, "right": False, "fly_mode" : False}
+        self.sounds = {}
         
-    def eval_inputs(self, event):
-        """For every pressed or released key, check if player has an action
-        variable assigned to the key and change it accordingly"""
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_w:
-                self.inputs["jump"] = True
-            if event.key == pygame.K_s:
-                self.inputs["squat"] = True
-            if event.key == pygame.K_d:
-                self.inputs["right"] = True
-            if event.key == pygame.K_a:
-                self.inputs["left"] = True
-            if event.key == pygame.K_f:
-                self.inputs["fly_mode"] = not self.inputs["fly_mode"]
-        if event.type == pygame.KEYUP:
-            if event.key == pygame.K_w:
-                self.inputs["jump"] = False
-            if event.key == pygame.K_s:
-                self.inputs["squat"] = False
-            if event.key == pygame.K_d:
-                self.inputs["right"] = False
-            if event.key == pygame.K_a:
-                self.inputs["left"] = False
-
-    def clamp_to_level_edge(self, level_size): #! Deprecated
-        """In case player gets to the edge of the world/level, clamp his position
-        to said edge"""
-        self.rect.left = max(self.rect.left, 0)
-        self.rect.right = min(self.rect.right, level_size[0])
-        self.rect.top = max(self.rect.top, 0)
-        self.rect.bottom = min(self.rect.bottom, level_size[1])
-
     def eval_movement(self):
         """Check the inputs related to the player's movement
         calculate the  horizontal movement using them, calculate vertical movement
@@ -203,10 +267,13 @@ class Player(AnimatedEntity):
             self.momentum = -3
             self.y_movement = self.momentum
             self.jump_ability -= 1
-            pygame.mixer.Sound.play(self.sounds["jump"])
+            if "jump" in self.sounds:
+                pygame.mixer.Sound.play(self.sounds["jump"])
 
     
 class Enemy(AnimatedEntity):
+    __slots__ = ()
+
     def __init__(self, pos, sprite_sheet, speed=2, colorkey=(255,255,255), sheet_size=(32,32), frame_size=(16,16)) -> None:
         super().__init__(pos, sprite_sheet, speed, colorkey, sheet_size, frame_size)
 
@@ -224,12 +291,247 @@ class Enemy(AnimatedEntity):
         entity should move according to inputs and physics. Adds the values calculated
         in eval_movement for one axis at a time and applies collisions. First checks
         movement and collisions in one axis, then in the other."""
+        self.previous_x, self.previous_y = self.rect.x, self.rect.y
         # calculate movement
         self.eval_movement(kwargs["player"]) 
 
         #Update entity's position and check collisions
-        self.move_and_collide(kwargs["tile_rects"])
+        self.move_and_collide(kwargs["collision_grid"])
 
         # Screen edge collisions
         if kwargs["level_size"] != 0:
             self.clamp_to_level_edge(kwargs["level_size"])
+
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(self)
+
+
+class SwarmEnemy():
+    __slots__ = ("swarm", "index")
+
+    def __init__(self, swarm, index) -> None:
+        """One enemy of an EnemySwarm as an object with a rect, so it can be listed
+        in a spatial_lib.SpatialHash and returned by its queries; index is the
+        enemy's position in the swarm's arrays."""
+        self.swarm = swarm
+        self.index = index
+
+    @property
+    def rect(self):
+        return pygame.Rect(int(self.swarm.x[self.index]), int(self.swarm.y[self.index]), self.swarm.width, self.swarm.height)
+
+
+class EnemySwarm():
+    def __init__(self, sprite_sheet, speed=2, colorkey=(255,255,255), sheet_size=(32,32), frame_size=(16,16), tile_size=16) -> None:
+        """Many enemies simulated at once. Instead of a list of Enemy objects, state
+        of every enemy is kept in numpy arrays (struct of arrays), so steering,
+        collisions and animation of all of them are computed in a few array operations.
+        Enemies behave like Enemy.update and AnimatedEntity.animate; they share
+        frames of a single template Enemy."""
+        self.template = Enemy((0, 0), sprite_sheet, speed, colorkey, sheet_size, frame_size)
+        self.template.setup_animations()
+        self.animations = self.template.oriented_animations[False][False]
+        self.flipped_animations = self.template.oriented_animations[True][False]
+        self.animation_names = list(self.animations)
+        self.width, self.height = self.template.rect.size
+        self.tile_size = tile_size
+        # Physics state; float positions and whole pixel rect coordinates, like Entity.pos_x and rect.x
+        self.pos_x = numpy.zeros(0)
+        self.pos_y = numpy.zeros(0)
+        self.x = numpy.zeros(0, dtype=numpy.int64)
+        self.y = numpy.zeros(0, dtype=numpy.int64)
+        # positions before the last tick, for interpolated rendering
+        self.previous_x = numpy.zeros(0, dtype=numpy.int64)
+        self.previous_y = numpy.zeros(0, dtype=numpy.int64)
+        self.speed = numpy.zeros(0)
+        self.x_movement = numpy.zeros(0)
+        self.y_movement = numpy.zeros(0)
+        # Animation state; active animation is an index in animation_names
+        self.active_animation = numpy.zeros(0, dtype=numpy.int64)
+        self.previous_animation = numpy.full(0, -1, dtype=numpy.int64)
+        self.frame_index = numpy.zeros(0, dtype=numpy.int64)
+        self.frame_timer = numpy.zeros(0, dtype=numpy.int64)
+        self.frame_counts = numpy.array([len(self.animations[name]) for name in self.animation_names])
+        # Broad phase the enemies are registered in as SwarmEnemy objects, see register()
+        self.spatial_hash = None
+        self.members = []
+        self.cell_spans = numpy.zeros((0, 4), dtype=numpy.int64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn(self, pos, speed=None):
+        """Adds an enemy at pos; speed defaults to the one the swarm was created with.
+        Collisions are only resolved right while enemies move less than a tile per
+        tick (see move_and_collide), so faster ones are refused."""
+        if speed is None:
+            speed = self.template.speed
+        if speed >= self.tile_size:
+            raise ValueError("Enemy speed {} too high, swarm enemies must move less than a tile ({} px) per tick".format(speed, self.tile_size))
+        self.pos_x = numpy.append(self.pos_x, float(pos[0]))
+        self.pos_y = numpy.append(self.pos_y, float(pos[1]))
+        self.x = numpy.append(self.x, math.floor(pos[0]))
+        self.y = numpy.append(self.y, math.floor(pos[1]))
+        self.previous_x = numpy.append(self.previous_x, math.floor(pos[0]))
+        self.previous_y = numpy.append(self.previous_y, math.floor(pos[1]))
+        self.speed = numpy.append(self.speed, speed)
+        self.x_movement = numpy.append(self.x_movement, 0.0)
+        self.y_movement = numpy.append(self.y_movement, 0.0)
+        self.active_animation = numpy.append(self.active_animation, 0)
+        self.previous_animation = numpy.append(self.previous_animation, -1)
+        self.frame_index = numpy.append(self.frame_index, 0)
+        self.frame_timer = numpy.append(self.frame_timer, 0)
+        if self.spatial_hash is not None:
+            self.members.append(SwarmEnemy(self, len(self) - 1))
+            self.spatial_hash.insert(self.members[-1])
+            self.cell_spans = self.compute_cell_spans()
+
+    def register(self, spatial_hash):
+        """Adds every enemy to a spatial_lib.SpatialHash, which is then kept up to
+        date after every update, like for Entity.register"""
+        self.spatial_hash = spatial_hash
+        self.members = [SwarmEnemy(self, index) for index in range(len(self))]
+        for member in self.members:
+            spatial_hash.insert(member)
+        self.cell_spans = self.compute_cell_spans()
+
+    def unregister(self):
+        if self.spatial_hash is not None:
+            for member in self.members:
+                self.spatial_hash.remove(member)
+            self.spatial_hash = None
+            self.members = []
+
+    def compute_cell_spans(self):
+        """SpatialHash.cell_span of every enemy at once, as rows of an array"""
+        cell_size = self.spatial_hash.cell_size
+        return numpy.stack([self.x // cell_size, self.y // cell_size,
+                            (self.x + self.width - 1) // cell_size, (self.y + self.height - 1) // cell_size], axis=1)
+
+    def update_spatial_hash(self):
+        """Moves enemies that crossed a cell border to their new cells; which ones
+        did is found for all of them at once, so enemies staying put cost nothing"""
+        cell_spans = self.compute_cell_spans()
+        for index in numpy.nonzero((cell_spans != self.cell_spans).any(axis=1))[0].tolist():
+            self.spatial_hash.move(self.members[index])
+        self.cell_spans = cell_spans
+
+    def eval_movement(self, player):
+        """Steers every enemy straight towards the player with its speed"""
+        player_dist_x = self.x - player.rect.x
+        player_dist_y = self.y - player.rect.y
+        player_dist = numpy.maximum(numpy.hypot(player_dist_x, player_dist_y), 0.1)
+        self.x_movement = self.speed * -player_dist_x / player_dist
+        self.y_movement = self.speed * -player_dist_y / player_dist
+
+    def last_colliding_tile(self, collision_grid, x, y, start_x, start_y):
+        """For rects of every enemy at x, y finds the tile a per entity collision test
+        would resolve against last (bottom-most row, then right-most column). Tiles the
+        rect already overlapped at start_x, start_y are ignored, like collision_lib.sweep
+        does for Enemy. Returns arrays of tile x, tile y and whether there was any collision at all."""
+        first_x = x // self.tile_size
+        first_y = y // self.tile_size
+        last_x = (x + self.width - 1) // self.tile_size
+        last_y = (y + self.height - 1) // self.tile_size
+        # rect overlaps at most this many tiles in each axis
+        span_x = (self.width - 1) // self.tile_size + 2
+        span_y = (self.height - 1) // self.tile_size + 2
+        offset_y, offset_x = numpy.divmod(numpy.arange(span_x * span_y), span_x)
+        tiles_x = first_x[:, None] + offset_x[None, :]
+        tiles_y = first_y[:, None] + offset_y[None, :]
+        in_rect = (tiles_x <= last_x[:, None]) & (tiles_y <= last_y[:, None])
+        # tiles the rect was already in before moving
+        in_rect &= ~((tiles_x >= (start_x // self.tile_size)[:, None]) & (tiles_x <= ((start_x + self.width - 1) // self.tile_size)[:, None])
+                     & (tiles_y >= (start_y // self.tile_size)[:, None]) & (tiles_y <= ((start_y + self.height - 1) // self.tile_size)[:, None]))
+        solid = numpy.zeros(tiles_x.shape, dtype=bool)
+        solid[in_rect] = collision_grid.solid_at(tiles_x[in_rect], tiles_y[in_rect])
+        collided = solid.any(axis=1)
+        last = solid.shape[1] - 1 - numpy.argmax(solid[:, ::-1], axis=1)
+        rows = numpy.arange(len(x))
+        return tiles_x[rows, last], tiles_y[rows, last], collided
+
+    def move_and_collide(self, collision_grid):
+        """Moves all enemies one axis at a time and pushes the ones that ended up
+        inside a solid tile they weren't in before back to its edge, which is where
+        Enemy's sweep stops as long as enemies move less than a tile per tick"""
+        if len(self) == 0:
+            return
+        start_x = self.x
+        self.pos_x = self.pos_x + self.x_movement
+        self.x = numpy.floor(self.pos_x).astype(numpy.int64)
+        tile_x, _, collided = self.last_colliding_tile(collision_grid, self.x, self.y, start_x, self.y)
+        right = collided & (self.x_movement > 0)
+        left = collided & (self.x_movement < 0)
+        self.x[right] = tile_x[right] * self.tile_size - self.width
+        self.x[left] = (tile_x[left] + 1) * self.tile_size
+        self.pos_x[right | left] = self.x[right | left]
+
+        start_y = self.y
+        self.pos_y = self.pos_y + self.y_movement
+        self.y = numpy.floor(self.pos_y).astype(numpy.int64)
+        _, tile_y, collided = self.last_colliding_tile(collision_grid, self.x, self.y, self.x, start_y)
+        down = collided & (self.y_movement > 0)
+        up = collided & (self.y_movement < 0)
+        self.y[down] = tile_y[down] * self.tile_size - self.height
+        self.y[up] = (tile_y[up] + 1) * self.tile_size
+        self.pos_y[down | up] = self.y[down | up]
+
+    def clamp_to_level_edge(self, level_size):
+        self.pos_x = numpy.minimum(numpy.maximum(self.pos_x, 0), level_size[0] - self.width)
+        self.pos_y = numpy.minimum(numpy.maximum(self.pos_y, 0), level_size[1] - self.height)
+        self.x = numpy.floor(self.pos_x).astype(numpy.int64)
+        self.y = numpy.floor(self.pos_y).astype(numpy.int64)
+
+    def update(self, **kwargs) -> None:
+        """Same as Enemy.update, for all the enemies at once"""
+        self.previous_x = self.x.copy()
+        self.previous_y = self.y.copy()
+        self.eval_movement(kwargs["player"])
+        self.move_and_collide(kwargs["collision_grid"])
+        if kwargs["level_size"] != 0:
+            self.clamp_to_level_edge(kwargs["level_size"])
+        if self.spatial_hash is not None:
+            self.update_spatial_hash()
+
+    def animate(self, visible=None):
+        """Same as AnimatedEntity.animate, for all the enemies at once. visible is
+        a bool array of enemies to animate; the others keep their frame."""
+        active_animation = numpy.where(self.x_movement != 0, self.animation_names.index("run"), self.animation_names.index("idle"))
+        if visible is None:
+            visible = numpy.ones(len(self), dtype=bool)
+        self.active_animation = numpy.where(visible, active_animation, self.active_animation)
+        changed = visible & (self.active_animation != self.previous_animation)
+        self.frame_index[changed] = 0
+        self.frame_timer[changed] = 7
+        next_frame = visible & (self.frame_timer <= 0)
+        self.frame_index[next_frame] = (self.frame_index[next_frame] + 1) % self.frame_counts[self.active_animation[next_frame]]
+        self.frame_timer[next_frame] = 7
+        self.frame_timer[visible] -= 1
+        self.previous_animation = self.active_animation
+
+    def overlapping(self, rect):
+        """Bool array of enemies whose rect overlaps rect"""
+        return (self.x < rect.right) & (self.x + self.width > rect.left) & (self.y < rect.bottom) & (self.y + self.height > rect.top)
+
+    def sprites(self, alpha=1.0, view=None):
+        """List of (frame, (x, y)) of every enemy in world coordinates, alpha of the
+        way between positions before and after the last tick. With view rect given,
+        only enemies overlapping it are listed."""
+        draw_x = self.previous_x + (self.x - self.previous_x) * alpha
+        draw_y = self.previous_y + (self.y - self.previous_y) * alpha
+        active_animation, frame_index, flip = self.active_animation, self.frame_index, self.x_movement < 0
+        if view is not None:
+            visible = self.overlapping(view)
+            draw_x, draw_y, active_animation, frame_index, flip = (draw_x[visible], draw_y[visible], active_animation[visible],
+                                                                   frame_index[visible], flip[visible])
+        sprite_list = []
+        for name_index, frame_index, x, y, flip in zip(active_animation.tolist(), frame_index.tolist(),
+                                                      draw_x.tolist(), draw_y.tolist(), flip.tolist()):
+            animations = self.flipped_animations if flip else self.animations
+            sprite_list.append((animations[self.animation_names[name_index]][frame_index], (x, y)))
+        return sprite_list
+
+    def draw(self, canvas, camera, alpha=1.0):
+        """Blits every enemy camera can see onto canvas in a single blits call"""
+        blit_list = [(frame, (x - camera.x, y - camera.y)) for frame, (x, y) in self.sprites(alpha, camera.view())]
+        canvas.blits(blit_list, doreturn=False)
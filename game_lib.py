@@ -1,5 +1,5 @@
-import pygame, os
-import levels_lib, entity, setup_lib, camera_lib
+import pygame, os, time
+import levels_lib, setup_lib, assets_lib, camera_lib, storage_lib, timestep_lib, world_lib, replay_lib, profiler_lib, render_lib, input_lib
 
 class Gui():
     def __init__(self, size) -> None:
@@ -32,47 +32,60 @@ class Game():
     def __init__(self):
         self.active_screen = "menu"
 
-    def setup(self):
-        # Creating settings.json file
-        settings_path = str(os.path.join(os.path.dirname(os.path.realpath(__file__)), "settings.json"))
-        with open(str(settings_path), "w") as settings:
-            setup_lib.set_settings(settings_path)
+    def setup(self, settings_path=None):
+        # Creating settings.json file or filling in settings missing from it; the one next to the game by default
+        if settings_path is None:
+            settings_path = str(os.path.join(os.path.dirname(os.path.realpath(__file__)), "settings.json"))
+        setup_lib.set_settings(settings_path)
         # Reading from json settings file    
         settings = setup_lib.get_settings(settings_path)
         self.src_dir = settings["src_path"]  # source directory path
+        self.chunk_queue_depth = settings["chunk_queue_depth"]  # max chunks queued for background generation
+        self.chunk_memory_budget = settings["chunk_memory_budget"]  # bytes of chunks kept in memory
+        self.level_file = settings["level_file"]  # level from levels directory, infinite level if empty
+        self.tick_rate = settings["tick_rate"]  # simulation ticks per second
+        self.render_enabled = settings["render"]  # without rendering simulation runs as fast as it can
+        self.world_seed = settings["world_seed"]  # None gives random plants on the same terrain
+        self.record_inputs = settings["record_inputs"]  # path to save player inputs to, for replay
+        self.render_mode = settings["render_mode"]  # "dirty" or "full"
         # Setting up display and canvas for the game(needed for pixel scaling)
-        self.window = pygame.display.set_mode(settings["window_size"])
+        self.window = pygame.display.set_mode(settings["window_size"], pygame.RESIZABLE)
         self.game_canvas = pygame.Surface((self.window.get_width() // 4, self.window.get_height() // 4))
+        # Scales canvas into the window without allocating a new surface every frame
+        self.upscaler = render_lib.Upscaler(self.game_canvas, self.window, settings["scale_method"])
+        # Keys are looked up in tables made once from key bindings; needs the display set up
+        self.input_mapper = input_lib.InputMapper(settings["key_bindings"])
         # Setting up GUI surface
         self.GUI = Gui((self.window.get_width(), self.window.get_height()))
         # Setting up pygame clock object responsible for handling FPS
         self.clock = pygame.time.Clock()
-        # Getting assets
-        #images = setup_lib.load_images(src_dir)
-        self.tile_images = setup_lib.load_images(self.src_dir, "tiles")
-        self.player_images = setup_lib.load_images(self.src_dir, "player")
-        self.enemy_images = setup_lib.load_images(self.src_dir, "enemy")
+        # Getting assets; they are decoded in the background while the menu is shown
+        # and packed into one display-format atlas when the game starts
+        self.assets = assets_lib.AssetRegistry(self.src_dir, os.path.join(self.src_dir, "assets.bundle"))
+        self.assets.preload(("tiles", "player", "enemy"))
+        # Time first frame was shown, for startup benchmark
+        self.first_frame_time = None
 
     def menu(self):
         pygame.init()
-        pygame.mixer.music.load(os.path.join(self.src_dir, "sounds", "The Seatbelts - Cats on Mars-97xfV6yXcrk.mp3"))
-        pygame.mixer.music.play(-1)
+        input_lib.allow_events(input_lib.MENU_EVENTS)
         change_screen = False
         while True:
             self.clock.tick(60)
             #* Event loop
             mouse_left_pressed = False
-            for event in pygame.event.get():
+            commands, events = self.input_mapper.poll()
+            if "quit" in commands:
+                change_screen = True
+            for event in events:
                 if event.type == pygame.QUIT:
                     change_screen = True
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        change_screen = True
-                if event.type == pygame.KEYUP:
-                    pass
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
                         mouse_left_pressed = True
+                if event.type == pygame.VIDEORESIZE:
+                    self.resize_window()
+                    self.GUI = Gui(self.window.get_size())
             if change_screen:
                 self.active_screen = "game"
                 return False
@@ -87,26 +100,43 @@ class Game():
             self.GUI.draw("menu")
 
             self.game_canvas.fill((100,255,100))    
-            self.window.blit(pygame.transform.scale(self.game_canvas, self.window.get_size()), (0, 0))
+            self.upscaler.present()
             self.window.blit(self.GUI.surf, (0, 0))
             # updating the image
             pygame.display.update()
+            if self.first_frame_time is None:
+                self.first_frame_time = time.perf_counter()
+                # music is loaded only after something is already on screen
+                pygame.mixer.music.load(os.path.join(self.src_dir, "sounds", "The Seatbelts - Cats on Mars-97xfV6yXcrk.mp3"))
+                pygame.mixer.music.play(-1)
 
     def main_loop(self):
+        # Images preloaded during the menu, packed into the atlas
+        images = self.assets.atlas_groups(("tiles", "player", "enemy"))
+        self.tile_images = images["tiles"]
+        self.player_images = images["player"]
+        self.enemy_images = images["enemy"]
         # Creating a level
         CHUNK_SIZE = 8
-        level_dbg = levels_lib.LevelInf(self.game_canvas)
+        if self.level_file:
+            level_dbg = levels_lib.LevelFile(os.path.join(self.src_dir, "levels", self.level_file), chunk_size=CHUNK_SIZE)
+        else:
+            # every seed is a different world with its own edits
+            store_name = "world.chunks" if self.world_seed is None else "world_{}.chunks".format(self.world_seed)
+            chunk_store = storage_lib.ChunkStore(os.path.join(self.src_dir, "levels", store_name), CHUNK_SIZE, self.world_seed)
+            level_dbg = levels_lib.LevelInf(self.game_canvas, chunk_size=CHUNK_SIZE, max_pending=self.chunk_queue_depth,
+                                             store=chunk_store, memory_budget=self.chunk_memory_budget, seed=self.world_seed)
     
-        # Setting up the player object
-        player = entity.Player((300, 100), self.player_images, speed=3)
-        player.setup_animations()
-        #Setting up other entities
-        enemy1 = entity.Enemy((200, 100), self.enemy_images, frame_size=(32,32))
-        enemy1.setup_animations()
-        #Animations
+        # Player and enemies live in the world, which runs the simulation
+        world = world_lib.World(level_dbg, self.player_images, self.enemy_images)
+        player = world.player
+        enemies = world.enemies
+        input_log = replay_lib.InputLog(self.world_seed, self.level_file) if self.record_inputs else None
         
         # Setting up camera following the player
         camera = camera_lib.Camera()
+        for anim_entity in world.animated_entities:
+            camera.track(anim_entity)
 
         pygame.init()
         #sounds
@@ -115,48 +145,115 @@ class Game():
         player.sounds["jump"] = jump_sound
         pygame.mixer.music.load(os.path.join(self.src_dir, "sounds", "beepbox.wav"))
         pygame.mixer.music.play(-1)
-        animated_entities = [player, enemy1]
         change_screen = False
+        # Keys pressed in the menu don't carry over; only events the game handles get queued
+        input_lib.allow_events(input_lib.GAME_EVENTS)
+        input_mapper = self.input_mapper
+        input_mapper.reset()
+
+        # Simulation runs in fixed ticks, independent of frame rate
+        timestep = timestep_lib.FixedTimestep(self.tick_rate, realtime=self.render_enabled)
+        # Frame profiler; F3 toggles it together with its overlay, F4 dumps it to profile.json
+        profiler = profiler_lib.Profiler(enabled=False)
+        world.profiler = profiler
+        # Dirty rendering reuses the previous frame and only updates parts of the display that changed
+        renderer = render_lib.DirtyRenderer(self.game_canvas, self.upscaler) if self.render_mode == "dirty" else None
 
         running = True
         while running and self.active_screen == "game":
-            self.clock.tick(60)
+            if self.render_enabled:
+                frame_time = self.clock.tick(60) / 1000
+            else:
+                frame_time = self.clock.tick() / 1000
             #* Event loop
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    change_screen = True
-                    self.active_screen = "exit_screen"
-                if event.type == pygame.KEYDOWN:
-                    player.eval_inputs(event)
-                    if event.key == pygame.K_ESCAPE:
+            with profiler.span("events"):
+                # player inputs wait in input_mapper for the ticks below
+                commands, events = input_mapper.poll()
+                for command in commands:
+                    if command == "quit":
                         change_screen = True
                         self.active_screen = "exit_screen"
-                if event.type == pygame.KEYUP:
-                    player.eval_inputs(event)
+                    if command == "toggle_profiler":
+                        profiler.toggle()
+                        if renderer is not None:
+                            renderer.invalidate()  # overlay has to be drawn over or wiped
+                    if command == "dump_profile":
+                        profiler.dump(os.path.join(self.src_dir, "profile.json"))
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        change_screen = True
+                        self.active_screen = "exit_screen"
+                    if event.type == pygame.VIDEORESIZE:
+                        self.resize_window()
             
             if change_screen:
+                level_dbg.close()
+                if input_log is not None:
+                    input_log.save(self.record_inputs)
                 return False
 
-            #* Calculating physics
-            camera.update(player, self.game_canvas.get_size())       
+            #* Calculating physics, one fixed tick at a time, each with its own input mask
+            for tick in range(timestep.advance(frame_time)):
+                input_mask = input_mapper.next_mask()
+                if input_log is not None:
+                    input_log.record(world.tick_count, input_mask)
+                world.tick(input_mask)
+
+            if not self.render_enabled:
+                continue
+            # How far between the last two ticks this frame is
+            alpha = timestep.alpha
+            with profiler.span("camera"):
+                camera.update(player, self.game_canvas.get_size(), level_dbg.level_size, alpha)
+                # entities out of sight aren't animated
+                world.view = camera.view()
+                level_dbg.prefetch_chunks(camera, self.game_canvas.get_size(), (player.x_movement, player.y_movement))
 
             #* Drawing things onto screen
+            if renderer is not None:
+                self.draw_dirty(renderer, profiler, level_dbg, camera, world, alpha)
+                continue
             self.game_canvas.fill((100, 100, 255))
-            level_dbg.load_chunks(self.game_canvas, camera, self.tile_images)
+            with profiler.span("chunks"):
+                level_dbg.load_chunks(self.game_canvas, camera, self.tile_images)
             #level.update_surface(tile_images, camera, game_canvas) #Also blits tile map onto game_canvas
-            #animations
-            for anim_entity in animated_entities:
-                anim_entity.update(tile_rects=level_dbg.collision_map, player=player, level_size=0)
-                anim_entity.animate()
-                if anim_entity is player:
-                    self.game_canvas.blit(anim_entity.sprite, camera.player_pos)
-                else:
-                    self.game_canvas.blit(anim_entity.sprite, (anim_entity.rect.x-camera.x, anim_entity.rect.y-camera.y))
+            with profiler.span("entities"):
+                for anim_entity in camera.visible_objects():
+                    if anim_entity is player:
+                        self.game_canvas.blit(anim_entity.sprite, camera.player_pos)
+                    else:
+                        draw_rect = anim_entity.interpolated_rect(alpha)
+                        self.game_canvas.blit(anim_entity.sprite, (draw_rect.x-camera.x, draw_rect.y-camera.y))
+                enemies.draw(self.game_canvas, camera, alpha)
         
-            # translating game canvas onto entire game window
-            self.window.blit(pygame.transform.scale(self.game_canvas, self.window.get_size()), (0, 0))
-            # updating the image
-            pygame.display.update()
+            with profiler.span("present"):
+                # translating game canvas onto entire game window
+                self.upscaler.present()
+                if profiler.enabled:
+                    profiler.draw(self.window, self.clock.get_fps())
+                # updating the image
+                pygame.display.update()
+
+    def resize_window(self):
+        """Display surface changes with the window; upscaler works out the new target once"""
+        self.window = pygame.display.get_surface()
+        self.upscaler.resize(self.window)
+
+    def draw_dirty(self, renderer, profiler, level, camera, world, alpha):
+        """Draws a frame with render_lib.DirtyRenderer, pushing only changed parts to the display"""
+        with profiler.span("entities"):
+            sprites = [(entity.sprite, entity.interpolated_rect(alpha).topleft) for entity in camera.visible_objects()]
+            sprites.extend(world.enemies.sprites(alpha, camera.view()))
+        with profiler.span("chunks"):
+            if profiler.enabled:
+                renderer.invalidate()
+            dirty_rects = renderer.render(level, self.tile_images, camera, sprites)
+        with profiler.span("present"):
+            window_rects = renderer.present(dirty_rects)
+            if profiler.enabled:
+                profiler.draw(self.window, self.clock.get_fps())
+            if window_rects:
+                pygame.display.update(window_rects)
 
     def exit_game(self):
         pygame.quit()
@@ -0,0 +1,83 @@
+"""Runs the simulation without a window or sound, as fast as possible, and prints
+final state hashes as JSON. Meant for regression and performance runs on machines
+without a display, e.g.:
+
+    python headless.py --seeds 1 2 3 --ticks 3600
+    python headless.py --ticks 3600 --replay run.inputs
+
+A replay runs in the world it was recorded in, unless --seeds or --level say otherwise.
+"""
+import os, sys, json, time, argparse
+# dummy drivers have to be chosen before pygame initializes display or mixer
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+import levels_lib, assets_lib, world_lib, replay_lib
+
+
+def make_world(src_dir, seed, level_file="", enemy_count=1, assets=None):
+    """Builds a seeded world the same way the game does, with enemy_count enemies
+    lined up next to the first one. assets is an AssetRegistry to reuse between worlds."""
+    if level_file:
+        level = levels_lib.LevelFile(os.path.join(src_dir, "levels", level_file))
+    else:
+        level = levels_lib.LevelInf(None, seed=seed)
+    enemy_positions = [(200 - 20 * index, 100) for index in range(enemy_count)]
+    if assets is None:
+        assets = assets_lib.AssetRegistry(src_dir)
+    assets = assets.atlas_groups(("player", "enemy"))
+    return world_lib.World(level, assets["player"], assets["enemy"], enemy_positions=enemy_positions)
+
+
+def add_chunk_stats(result, level):
+    """Adds chunk cache counters (see levels_lib.ChunkCache.stats) of an infinite level to result"""
+    if isinstance(level, levels_lib.LevelInf):
+        result["chunk_cache"] = level.game_map.stats()
+    return result
+
+
+def run(src_dir, seed, ticks, input_log=None, level_file="", enemy_count=1):
+    """Steps a world for the given number of ticks, replaying input_log, and
+    returns its final state hash together with timing"""
+    world = make_world(src_dir, seed, level_file, enemy_count)
+    input_log = input_log or replay_lib.InputLog()
+    started = time.perf_counter()
+    for tick in range(ticks):
+        world.tick(input_log.mask_at(tick))
+    elapsed = time.perf_counter() - started
+    world.level.close()
+    return add_chunk_stats({"seed": seed, "ticks": ticks, "state_hash": world.state_hash(),
+                            "seconds": elapsed, "ticks_per_second": ticks / elapsed if elapsed else 0.0}, world.level)
+
+
+def parse_seed(text):
+    """World seed from the command line; "none" is the unseeded world, like world_seed null"""
+    return None if text.lower() == "none" else int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=parse_seed, nargs="+", help="world seeds, or none; 0 if not given, or the replay's seed")
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--replay", help="input log recorded by the game (record_inputs setting)")
+    parser.add_argument("--level", help="level file from levels directory; infinite level if not given, or the replay's level")
+    parser.add_argument("--enemies", type=int, default=1)
+    args = parser.parse_args()
+
+    pygame.init()
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    input_log = replay_lib.InputLog.load(args.replay) if args.replay else None
+    seeds = args.seeds
+    if seeds is None:
+        seeds = [input_log.seed] if input_log is not None else [0]
+    level_file = args.level
+    if level_file is None:
+        level_file = input_log.level_file if input_log is not None else ""
+    results = [run(src_dir, seed, args.ticks, input_log, level_file, args.enemies) for seed in seeds]
+    json.dump(results, sys.stdout, indent=4)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import collections, pygame
+import replay_lib
+
+# Action of every key, keys named the way pygame.key.key_code knows them; the key_bindings setting replaces it
+DEFAULT_BINDINGS = {"w": "jump", "s": "squat", "a": "left", "d": "right", "f": "fly_mode",
+                    "escape": "quit", "f3": "toggle_profiler", "f4": "dump_profile"}
+# Player inputs flipped by every press instead of held while the key is down
+TOGGLE_ACTIONS = ("fly_mode",)
+# Actions of the game itself; they don't go into input masks, poll() reports them once per press
+COMMANDS = ("quit", "toggle_profiler", "dump_profile")
+# Only these events are queued while a screen is shown, see allow_events
+MENU_EVENTS = [pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.VIDEORESIZE]
+GAME_EVENTS = [pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.VIDEORESIZE]
+
+
+def allow_events(event_types):
+    """From now on SDL queues only events of event_types and drops the rest before
+    they reach the queue, e.g. mouse motion or text input sent with every key press"""
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(event_types)
+
+
+class InputMapper():
+    def __init__(self, bindings=None, max_pending=8) -> None:
+        """Turns key events into player input masks (see replay_lib) through tables
+        keyed by keycode, made once from bindings - {key name: action}. Every change
+        of inputs is queued and given to the simulation one per tick by next_mask(),
+        so a key tapped between two ticks still reaches one of them and the game
+        runs on the same masks a replay of it would. At most max_pending changes wait;
+        every mask holds all inputs, so dropping the oldest one loses nothing but a tick."""
+        if bindings is None:
+            bindings = DEFAULT_BINDINGS
+        self.held_bits = {}  # keycode: bit of an input held while the key is down
+        self.toggle_bits = {}  # keycode: bit of an input flipped by a press
+        self.commands = {}  # keycode: command
+        for key_name, action in bindings.items():
+            try:
+                keycode = pygame.key.key_code(key_name)
+            except ValueError:
+                raise ValueError("Unknown key {} in key bindings".format(key_name))
+            if action in COMMANDS:
+                self.commands[keycode] = action
+            elif action in TOGGLE_ACTIONS:
+                self.toggle_bits[keycode] = 1 << replay_lib.INPUT_NAMES.index(action)
+            elif action in replay_lib.INPUT_NAMES:
+                self.held_bits[keycode] = 1 << replay_lib.INPUT_NAMES.index(action)
+            else:
+                raise ValueError("Unknown action {} bound to {}, use one of {}".format(
+                    action, key_name, replay_lib.INPUT_NAMES + list(COMMANDS)))
+        self.pending = collections.deque(maxlen=max_pending)
+        self.reset()
+
+    def reset(self):
+        """Forgets keys held and changes not given to a tick, e.g. when the game starts"""
+        self.pressed = {}  # keycode: bit, of bound keys held down
+        self.toggled = 0
+        self.latest = 0  # mask after every event read so far
+        self.mask = 0  # mask of the last tick
+        self.pending.clear()
+
+    def poll(self):
+        """Reads every queued event. Bound keys change input masks waiting for ticks;
+        returns list of commands pressed and list of all other events."""
+        commands = []
+        events = []
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                key = event.key
+                if key in self.held_bits:
+                    self.pressed[key] = self.held_bits[key]
+                elif key in self.toggle_bits:
+                    self.toggled ^= self.toggle_bits[key]
+                elif key in self.commands:
+                    commands.append(self.commands[key])
+                    continue
+                else:
+                    events.append(event)
+                    continue
+            elif event.type == pygame.KEYUP:
+                if self.pressed.pop(event.key, None) is None:
+                    continue
+            else:
+                events.append(event)
+                continue
+            mask = self.toggled
+            for bit in self.pressed.values():
+                mask |= bit
+            if mask != self.latest:
+                self.latest = mask
+                self.pending.append(mask)
+        return commands, events
+
+    def next_mask(self):
+        """Input mask of the next simulation tick: the oldest change not given to a
+        tick yet, or the same one as last tick"""
+        if self.pending:
+            self.mask = self.pending.popleft()
+        return self.mask
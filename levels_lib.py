@@ -1,54 +1,540 @@
-import random, math, pygame, noise
+import os, random, math, sys, collections, pygame, noise, numpy
+from concurrent import futures
+import collision_lib
 
-class LevelInf():
-    def __init__(self, game_canvas, tile_size=16, chunk_size=8) -> None:
+#Tile id stored in chunk arrays is the index of tile's name in TILE_TYPES
+TILE_TYPES = ["sky", "dirt", "grass", "plant"]
+SKY, DIRT, GRASS, PLANT = range(len(TILE_TYPES))
+#Lookup table telling which tile ids entities collide with
+SOLID_TILES = numpy.array([False, True, True, False])
+#Estimated memory taken by one solid tile in the collision grid (rect and its key)
+COLLISION_TILE_BYTES = sys.getsizeof(pygame.Rect(0, 0, 1, 1)) + sys.getsizeof((0, 0))
+#Terrain noise repeats every NOISE_PERIOD / 0.1 tiles
+NOISE_PERIOD = 999999
+
+
+class ChunkCache():
+    def __init__(self, memory_budget=4*1024*1024) -> None:
+        """Chunks of the level kept in least recently used order, together with
+        estimated memory each of them takes. Counts hits, misses and evictions."""
+        self.chunks = collections.OrderedDict()
+        self.sizes = {}
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, coords):
+        return coords in self.chunks
+
+    def __getitem__(self, coords):
+        return self.chunks[coords]
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def get(self, coords):
+        """Returns the chunk and marks it as most recently used, or None if it isn't cached"""
+        chunk_data = self.chunks.get(coords)
+        if chunk_data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.chunks.move_to_end(coords)
+        return chunk_data
+
+    def put(self, coords, chunk_data, size):
+        if coords in self.chunks:
+            self.memory_used -= self.sizes[coords]
+        self.chunks[coords] = chunk_data
+        self.chunks.move_to_end(coords)
+        self.sizes[coords] = size
+        self.memory_used += size
+
+    def pop_over_budget(self, keep):
+        """Removes least recently used chunks until memory used fits in the budget
+        and returns list of (coords, chunk) removed. Chunks in keep are never removed."""
+        evicted = []
+        for coords in list(self.chunks):
+            if self.memory_used <= self.memory_budget:
+                break
+            if coords in keep:
+                continue
+            evicted.append((coords, self.chunks.pop(coords)))
+            self.memory_used -= self.sizes.pop(coords)
+            self.evictions += 1
+        return evicted
+
+    def stats(self):
+        return {"chunks": len(self.chunks), "memory_used": self.memory_used, "memory_budget": self.memory_budget,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class Level():
+    def __init__(self, tile_size=16, chunk_size=8, cache_margin=2) -> None:
+        """Parts shared by all levels: level is drawn in chunks of chunk_size*chunk_size
+        tiles, each baked into a single surface stored in chunk_surfaces; surfaces further
+        than cache_margin chunks from the view are dropped. level_size is 0 for
+        infinite levels, otherwise it's level's size in pixels. changed_chunks collects
+        chunks near the view whose tiles appeared or changed, for renderers that reuse
+        what they drew before (see render_lib)."""
+        self.CHUNK_SIZE = chunk_size
+        self.tile_size = tile_size
+        self.chunk_surfaces = {}
+        self.dirty_chunks = set()
+        self.changed_chunks = set()
+        self.cache_margin = cache_margin
+        self.level_size = 0
+        # First and last chunk of the range drawn last, None until something is drawn
+        self.drawn_range = None
+
+    def visible_chunks_range(self, canvas, camera):
+        """Returns coordinates of top left visible chunk and how many chunks fit the
+        canvas in each axis"""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        chunks_to_draw_x = math.ceil(canvas.get_width() / chunk_px) + 1
+        chunks_to_draw_y = math.ceil(canvas.get_height() / chunk_px) + 1
+        first_x = int(math.floor(camera.x / chunk_px))
+        first_y = int(math.floor(camera.y / chunk_px))
+        return first_x, first_y, chunks_to_draw_x, chunks_to_draw_y
+
+    def prefetch_chunks(self, camera, canvas_size, velocity, look_ahead=30):
+        pass
+
+    def ensure_chunks(self, rect):
+        return set()
+
+    def ensure_chunks_many(self, left, top, right, bottom):
+        return set()
+
+    def retain_chunks(self, chunks):
+        pass
+
+    def close(self):
+        pass
+
+    def bake_chunk(self, chunk_data, tile_images):
+        """Draws every tile of a chunk onto one colorkeyed surface of chunk size,
+        so the whole chunk can be drawn with a single blit."""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        chunk_surf = pygame.Surface((chunk_px, chunk_px))
+        if pygame.display.get_surface() is not None:
+            chunk_surf = chunk_surf.convert()
+        # tiles are keyed out on black, so empty parts of the chunk are black too;
+        # baked chunks rarely change, which makes them worth RLE acceleration
+        chunk_surf.fill((0, 0, 0))
+        chunk_surf.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        for y_pos, x_pos in numpy.argwhere(chunk_data != SKY):
+            tile_type = tile_images[TILE_TYPES[chunk_data[y_pos, x_pos]]]
+            chunk_surf.blit(tile_type, (int(x_pos)*self.tile_size, int(y_pos)*self.tile_size))
+        return chunk_surf
+
+    def near_view(self, chunk_x, chunk_y):
+        """Whether the chunk is at most cache_margin chunks from the range drawn last"""
+        if self.drawn_range is None:
+            return False
+        first_x, first_y, last_x, last_y = self.drawn_range
+        return (first_x - self.cache_margin <= chunk_x <= last_x + self.cache_margin
+                and first_y - self.cache_margin <= chunk_y <= last_y + self.cache_margin)
+
+    def mark_changed(self, chunk_x, chunk_y):
+        """Adds the chunk to changed_chunks if it's near the view; nothing is collected
+        until something is drawn, so headless runs don't collect every chunk"""
+        if self.near_view(chunk_x, chunk_y):
+            self.changed_chunks.add((chunk_x, chunk_y))
+
+    def evict_chunk_surfaces(self, first_x, first_y, last_x, last_y):
+        """Drops baked surfaces of chunks further than cache_margin chunks
+        from the visible range; they are baked again when they come back into view.
+        Changes of chunks that far don't matter to renderers either."""
+        self.drawn_range = (first_x, first_y, last_x, last_y)
+        for chunk_x, chunk_y in list(self.chunk_surfaces):
+            if not self.near_view(chunk_x, chunk_y):
+                del self.chunk_surfaces[(chunk_x, chunk_y)]
+        for chunk_x, chunk_y in list(self.changed_chunks):
+            if not self.near_view(chunk_x, chunk_y):
+                self.changed_chunks.discard((chunk_x, chunk_y))
+
+    def draw_chunk(self, canvas, camera, target_x, target_y, chunk_data, tile_images):
+        """Blits only the part of chunk's baked surface that lands inside canvas clip
+        area, baking it first if needed; chunks entirely outside of it are skipped."""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        chunk_rect = pygame.Rect(int(target_x*chunk_px - camera.x), int(target_y*chunk_px - camera.y), chunk_px, chunk_px)
+        visible_rect = chunk_rect.clip(canvas.get_clip())
+        if not visible_rect.width or not visible_rect.height:
+            return
+        target_chunk = (target_x, target_y)
+        if target_chunk not in self.chunk_surfaces or target_chunk in self.dirty_chunks:
+            self.chunk_surfaces[target_chunk] = self.bake_chunk(chunk_data, tile_images)
+            self.dirty_chunks.discard(target_chunk)
+        canvas.blit(self.chunk_surfaces[target_chunk], visible_rect, visible_rect.move(-chunk_rect.x, -chunk_rect.y))
+
+
+class WorldGenerator():
+    def __init__(self, seed=None, chunk_size=8) -> None:
+        """Terrain of the infinite level, where every chunk is a pure function of
+        (seed, chunk x, chunk y): heights come from noise picked by the seed and every
+        chunk places its plants with its own random generator, derived from the seed
+        and its coordinates. Chunks can be generated in any order, on any thread or
+        process, and thrown away and generated again the same. Without a seed terrain
+        is always the same and plants are picked by a seed drawn once per generator."""
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.noise_base = 0 if seed is None else random.Random(seed).randrange(256)
+        # SeedSequence needs a non negative seed
+        self.entropy = numpy.random.SeedSequence(None if seed is None else seed % 2**64).entropy
+
+    def chunk_random(self, chunk_x, chunk_y):
+        """Random generator of one chunk; the same for the same seed and coordinates"""
+        return numpy.random.default_rng(numpy.random.SeedSequence(self.entropy, spawn_key=(chunk_x % 2**32, chunk_y % 2**32)))
+
+    def column_heights(self, chunk_x):
+        """Terrain height of every tile column in the chunk; noise is sampled
+        once per column, as height depends only on x"""
+        first_x = chunk_x * self.chunk_size
+        noise_values = [noise.pnoise1(target_x*0.1, repeat=NOISE_PERIOD, base=self.noise_base) for target_x in range(first_x, first_x + self.chunk_size)]
+        return (numpy.array(noise_values) * 5).astype(numpy.int32)
+
+    def classify_chunk(self, heights, chunk_x, chunk_y):
+        """Turns column heights into the chunk's array of tile ids: dirt below the
+        surface, grass on it and randomly placed plants right above it"""
+        target_y = chunk_y * self.chunk_size + numpy.arange(self.chunk_size)[:, None]
+        surface_y = 8 - heights[None, :]
+        chunk_data = numpy.where(target_y > surface_y, DIRT, SKY).astype(numpy.uint8)
+        chunk_data[target_y == surface_y] = GRASS
+        plant_spots = numpy.nonzero(target_y == surface_y - 1)
+        if len(plant_spots[0]):
+            # only chunks the surface runs through need a generator
+            rolls = self.chunk_random(chunk_x, chunk_y).random(len(plant_spots[0]))
+            chunk_data[plant_spots[0][rolls < 0.3], plant_spots[1][rolls < 0.3]] = PLANT
+        return chunk_data
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        return self.classify_chunk(self.column_heights(chunk_x), chunk_x, chunk_y)
+
+    def generate_chunks(self, chunk_coords):
+        """Generates many chunks at once, sampling height of each column only once
+        for all the chunks stacked above each other. Returns dict of coords: chunk."""
+        heights = {}
+        chunks = {}
+        for chunk_x, chunk_y in chunk_coords:
+            if chunk_x not in heights:
+                heights[chunk_x] = self.column_heights(chunk_x)
+            chunks[(chunk_x, chunk_y)] = self.classify_chunk(heights[chunk_x], chunk_x, chunk_y)
+        return chunks
+
+    def stream_chunks(self, first_x, first_y, last_x, last_y):
+        """Yields ((chunk_x, chunk_y), chunk) for every chunk of the region between the
+        two corner chunks, both included, column after column. Heights are sampled once
+        per column and nothing is kept, so a region of any size can be streamed, e.g.
+        straight into a storage_lib.ChunkStore."""
+        for chunk_x in range(first_x, last_x + 1):
+            heights = self.column_heights(chunk_x)
+            for chunk_y in range(first_y, last_y + 1):
+                yield (chunk_x, chunk_y), self.classify_chunk(heights, chunk_x, chunk_y)
+
+
+class LevelInf(Level):
+    def __init__(self, game_canvas, tile_size=16, chunk_size=8, cache_margin=2, workers=2, max_pending=16, store=None, memory_budget=4*1024*1024, seed=None) -> None:
         """Create starting variables, specifying level_size and size of tiles
         used in the level; file which the level will be written to;
         list to store the level file and initialized objects built from the
-        level file."""
-        self.CHUNK_SIZE = chunk_size
-        self.tile_size = tile_size
-        self.game_map = {}
-        self.collision_map = []
-
-    def generate_chunk(self, x, y):
-        chunk_data = []
-        for y_pos in range(self.CHUNK_SIZE):
-            for x_pos in range(self.CHUNK_SIZE):
-                target_x = x * self.CHUNK_SIZE + x_pos
-                target_y = y * self.CHUNK_SIZE + y_pos
-                tile_type = "sky"
-                height = int(noise.pnoise1(target_x*0.1, repeat=999999) * 5)
-
-                if target_y > 8 - height:
-                    tile_type = "dirt"
-                elif target_y == 8 - height:
-                    tile_type = "grass"
-                elif target_y == 8 - height - 1:
-                    if random.random() < 0.3:
-                        tile_type = "plant"
-                if tile_type != "sky":
-                    chunk_data.append([[target_x, target_y], tile_type])
+        level file. Chunks are stored as uint8 arrays of tile ids indexed [y, x] in
+        a ChunkCache, which drops least recently used chunks once they take more than
+        memory_budget bytes. Chunks are generated ahead of time by a pool of worker
+        threads, with at most max_pending of them queued. If a storage_lib.ChunkStore
+        is given, chunks changed with set_tile are saved to it and read back from it
+        instead of being generated again. Chunks are made by a WorldGenerator with the
+        given seed; without it terrain is always the same and plants are random."""
+        super().__init__(tile_size, chunk_size, cache_margin)
+        self.game_map = ChunkCache(memory_budget)
+        self.collision_grid = collision_lib.CollisionGrid(tile_size)
+        self.executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self.pending_chunks = {}
+        self.max_pending = max_pending
+        self.store = store
+        self.modified_chunks = set()
+        # Chunks drawn last and chunks the last simulation tick needed; never evicted
+        self.visible_chunks = set()
+        self.simulated_chunks = set()
+        # Chunk ranges of the rects given to ensure_chunks_many last, and how many of them need each chunk
+        self.many_ranges = None
+        self.many_chunks = collections.Counter()
+        self.seed = seed
+        # pure, so worker threads share it without locking
+        self.generator = WorldGenerator(seed, chunk_size)
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        return self.generator.generate_chunk(chunk_x, chunk_y)
+
+    def add_chunk(self, chunk_x, chunk_y, chunk_data):
+        """Stores a new chunk and registers its solid tiles in the collision grid once"""
+        origin_x = chunk_x * self.CHUNK_SIZE
+        origin_y = chunk_y * self.CHUNK_SIZE
+        for y_pos, x_pos in numpy.argwhere(SOLID_TILES[chunk_data]):
+            self.collision_grid.add_tile(origin_x + int(x_pos), origin_y + int(y_pos))
+        size = sys.getsizeof(chunk_data) + int(SOLID_TILES[chunk_data].sum()) * COLLISION_TILE_BYTES
+        self.game_map.put((chunk_x, chunk_y), chunk_data, size)
+        self.mark_changed(chunk_x, chunk_y)
+
+    def remove_chunk(self, chunk_x, chunk_y, chunk_data):
+        """Forgets everything derived from an evicted chunk: its collision tiles
+        and baked surface. Changed chunks are saved to the store first."""
+        origin_x = chunk_x * self.CHUNK_SIZE
+        origin_y = chunk_y * self.CHUNK_SIZE
+        for y_pos, x_pos in numpy.argwhere(SOLID_TILES[chunk_data]):
+            self.collision_grid.remove_tile(origin_x + int(x_pos), origin_y + int(y_pos))
+        if (chunk_x, chunk_y) in self.modified_chunks:
+            self.store.save(chunk_x, chunk_y, chunk_data)
+            self.modified_chunks.discard((chunk_x, chunk_y))
+        self.chunk_surfaces.pop((chunk_x, chunk_y), None)
+        self.dirty_chunks.discard((chunk_x, chunk_y))
+        self.changed_chunks.discard((chunk_x, chunk_y))
+
+    def evict_chunks(self, keep):
+        """Evicts least recently used chunks over the memory budget, except the ones
+        in keep. Changed chunks are only evicted when there is a store to save them to."""
+        if self.store is None:
+            keep = keep | self.modified_chunks
+        for (chunk_x, chunk_y), chunk_data in self.game_map.pop_over_budget(keep):
+            self.remove_chunk(chunk_x, chunk_y, chunk_data)
+
+    def load_stored_chunk(self, chunk_x, chunk_y):
+        """Adds the chunk from the chunk store to the map. Returns False if it isn't stored."""
+        if self.store is None or (chunk_x, chunk_y) not in self.store:
+            return False
+        self.add_chunk(chunk_x, chunk_y, self.store.load(chunk_x, chunk_y))
+        return True
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """Returns tiles of the chunk, reading it from the store or generating it
+        first if it doesn't exist yet."""
+        chunk_data = self.game_map.get((chunk_x, chunk_y))
+        if chunk_data is None:
+            if not self.load_stored_chunk(chunk_x, chunk_y):
+                self.add_chunk(chunk_x, chunk_y, self.generate_chunk(chunk_x, chunk_y))
+            chunk_data = self.game_map[(chunk_x, chunk_y)]
         return chunk_data
 
+    def request_chunk(self, chunk_x, chunk_y):
+        """Queues generation of the chunk in the worker pool, unless it already
+        exists, is queued or the queue is full. Returns False if queue is full."""
+        return self.request_chunks([(chunk_x, chunk_y)])
+
+    def request_chunks(self, chunk_coords):
+        """Queues generation of chunks that don't exist and aren't queued yet as a
+        single task of the worker pool, so chunks of one column share sampled heights
+        (see WorldGenerator.generate_chunks). Only as many as fit in the queue are
+        queued, first ones first; returns False if some didn't fit."""
+        wanted_chunks = []
+        for chunk_x, chunk_y in chunk_coords:
+            target_chunk = (chunk_x, chunk_y)
+            if target_chunk in self.game_map or target_chunk in self.pending_chunks or target_chunk in wanted_chunks:
+                continue
+            if self.load_stored_chunk(chunk_x, chunk_y):
+                continue
+            wanted_chunks.append(target_chunk)
+        free = self.max_pending - len(self.pending_chunks)
+        queued_chunks = wanted_chunks[:max(free, 0)]
+        if queued_chunks:
+            future = self.executor.submit(self.generator.generate_chunks, queued_chunks)
+            for target_chunk in queued_chunks:
+                self.pending_chunks[target_chunk] = future
+        return len(queued_chunks) == len(wanted_chunks)
+
+    def collect_chunks(self):
+        """Adds every chunk finished by the workers to the map. Collision grid is
+        only ever changed here, on the main thread."""
+        for target_chunk, future in list(self.pending_chunks.items()):
+            if future.done():
+                del self.pending_chunks[target_chunk]
+                if target_chunk not in self.game_map:
+                    self.add_chunk(target_chunk[0], target_chunk[1], future.result()[target_chunk])
+
+    def prefetch_chunks(self, camera, canvas_size, velocity, look_ahead=30):
+        """Predicts where the camera will be look_ahead frames from now using
+        velocity (pixels per frame) and queues missing chunks around the predicted view,
+        a column at a time, columns with chunks nearest to its centre first."""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        predicted_x = camera.x + velocity[0] * look_ahead
+        predicted_y = camera.y + velocity[1] * look_ahead
+        first_x = int(math.floor(min(camera.x, predicted_x) / chunk_px)) - 1
+        first_y = int(math.floor(min(camera.y, predicted_y) / chunk_px)) - 1
+        last_x = int(math.floor((max(camera.x, predicted_x) + canvas_size[0]) / chunk_px)) + 1
+        last_y = int(math.floor((max(camera.y, predicted_y) + canvas_size[1]) / chunk_px)) + 1
+        centre_x = (predicted_x + canvas_size[0] / 2) / chunk_px
+        centre_y = (predicted_y + canvas_size[1] / 2) / chunk_px
+        wanted_chunks = [(x, y) for y in range(first_y, last_y + 1) for x in range(first_x, last_x + 1)
+                         if (x, y) not in self.game_map]
+        wanted_chunks.sort(key=lambda coords: (coords[0] + 0.5 - centre_x)**2 + (coords[1] + 0.5 - centre_y)**2)
+        columns = {}
+        for chunk_x, chunk_y in wanted_chunks:
+            columns.setdefault(chunk_x, []).append((chunk_x, chunk_y))
+        for column in columns.values():
+            if not self.request_chunks(column):
+                break
+
+    def ensure_chunks(self, rect):
+        """Makes sure chunks under rect (and one tile around it) exist, generating
+        them right away if the workers haven't delivered them yet. Used so entities
+        never fall through a chunk that is still being generated. Returns set of the chunks."""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        area = rect.inflate(self.tile_size * 2, self.tile_size * 2)
+        ensured_chunks = set()
+        for chunk_y in range(area.top // chunk_px, (area.bottom - 1) // chunk_px + 1):
+            for chunk_x in range(area.left // chunk_px, (area.right - 1) // chunk_px + 1):
+                self.get_chunk(chunk_x, chunk_y)
+                ensured_chunks.add((chunk_x, chunk_y))
+        return ensured_chunks
+
+    def ensure_chunks_many(self, left, top, right, bottom):
+        """Batch version of ensure_chunks - takes arrays of rect edges, e.g. of every
+        enemy in a swarm. Only rects whose chunk range changed since the last call are
+        looked at, like EnemySwarm.update_spatial_hash does with cell spans, and every
+        range only once, however many rects share it. Returns set of the chunks."""
+        chunk_px = self.CHUNK_SIZE * self.tile_size
+        ranges = numpy.stack([(left - self.tile_size) // chunk_px, (top - self.tile_size) // chunk_px,
+                              (right - 1 + self.tile_size) // chunk_px, (bottom - 1 + self.tile_size) // chunk_px], axis=1).astype(numpy.int64)
+        if self.many_ranges is None or len(ranges) != len(self.many_ranges):
+            # different rects, count them all again
+            self.many_chunks = collections.Counter()
+            self.count_ranges(ranges, 1)
+        else:
+            changed = (ranges != self.many_ranges).any(axis=1)
+            if changed.any():
+                self.count_ranges(self.many_ranges[changed], -1)
+                self.count_ranges(ranges[changed], 1)
+        self.many_ranges = ranges
+        # plain membership test, so chunks already there don't count as cache hits;
+        # missing ones in order, so chunks are cached the same way every run
+        for chunk_x, chunk_y in sorted(chunk for chunk in self.many_chunks if chunk not in self.game_map):
+            self.get_chunk(chunk_x, chunk_y)
+        return set(self.many_chunks)
+
+    def count_ranges(self, ranges, step):
+        """Adds step to the count of every chunk in the ranges, dropping chunks no range needs anymore"""
+        unique_ranges, counts = numpy.unique(ranges, axis=0, return_counts=True)
+        for (first_x, first_y, last_x, last_y), count in zip(unique_ranges.tolist(), counts.tolist()):
+            for chunk_y in range(first_y, last_y + 1):
+                for chunk_x in range(first_x, last_x + 1):
+                    self.many_chunks[(chunk_x, chunk_y)] += step * count
+                    if not self.many_chunks[(chunk_x, chunk_y)]:
+                        del self.many_chunks[(chunk_x, chunk_y)]
+
+    def retain_chunks(self, chunks):
+        """Called by the simulation every tick with the chunks it needed; chunks over
+        the memory budget are evicted here too, so the budget holds without drawing,
+        e.g. in headless runs. Chunks drawn last are kept as well."""
+        self.simulated_chunks = chunks
+        self.evict_chunks(chunks | self.visible_chunks)
+
+    def save_chunks(self):
+        """Writes every chunk changed since the last save to the chunk store.
+        Chunks that were only generated are not stored, they can be generated again."""
+        if self.store is None:
+            return
+        for chunk_x, chunk_y in self.modified_chunks:
+            self.store.save(chunk_x, chunk_y, self.game_map[(chunk_x, chunk_y)])
+        self.modified_chunks = set()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending_chunks = {}
+        self.save_chunks()
+        if self.store is not None:
+            self.store.close()
+
+    def set_tile(self, tile_x, tile_y, tile_id):
+        """Replaces the tile at given tile coordinates with tile_id (SKY removes it)
+        and marks the chunk it belongs to, so its baked surface is rebuilt on next draw."""
+        chunk_x = tile_x // self.CHUNK_SIZE
+        chunk_y = tile_y // self.CHUNK_SIZE
+        chunk_data = self.get_chunk(chunk_x, chunk_y)
+        chunk_data[tile_y - chunk_y*self.CHUNK_SIZE, tile_x - chunk_x*self.CHUNK_SIZE] = tile_id
+        if SOLID_TILES[tile_id]:
+            self.collision_grid.add_tile(tile_x, tile_y)
+        else:
+            self.collision_grid.remove_tile(tile_x, tile_y)
+        self.dirty_chunks.add((chunk_x, chunk_y))
+        self.mark_changed(chunk_x, chunk_y)
+        self.modified_chunks.add((chunk_x, chunk_y))
+
     def load_chunks(self, canvas, camera, tile_images):
-        self.collision_map = []
-        chunks_to_draw_x = math.ceil(canvas.get_width() / (self.CHUNK_SIZE*self.tile_size)) + 1
-        chunks_to_draw_y = math.ceil(canvas.get_height() / (self.CHUNK_SIZE*self.tile_size)) + 1
+        first_x, first_y, chunks_to_draw_x, chunks_to_draw_y = self.visible_chunks_range(canvas, camera)
+        self.collect_chunks()
+        visible_chunks = set()
         for y in range(chunks_to_draw_y):
             for x in range(chunks_to_draw_x):
-                target_x = int(x + math.floor(camera.x / (self.CHUNK_SIZE*self.tile_size)))
-                target_y = int(y + math.floor(camera.y / (self.CHUNK_SIZE*self.tile_size)))
-                target_chunk = str(target_x) + "_" + str(target_y)
-                
+                target_x = x + first_x
+                target_y = y + first_y
+                visible_chunks.add((target_x, target_y))
+                #Chunk isn't generated yet - leave it empty for now instead of waiting;
+                #it's only looked up once it exists, so waiting frames don't count as misses
+                if (target_x, target_y) not in self.game_map:
+                    self.request_chunk(target_x, target_y)
+                    continue
+                chunk_data = self.game_map.get((target_x, target_y))
+                self.draw_chunk(canvas, camera, target_x, target_y, chunk_data, tile_images)
+        self.evict_chunk_surfaces(first_x, first_y, first_x + chunks_to_draw_x - 1, first_y + chunks_to_draw_y - 1)
+        self.visible_chunks = visible_chunks
+        self.evict_chunks(visible_chunks | self.simulated_chunks)
 
-                if target_chunk not in self.game_map:
-                    self.game_map[target_chunk] = self.generate_chunk(target_x, target_y)
-                for tile in self.game_map[target_chunk]:
-                    tile_type = tile_images[tile[1]] #tile[1] stores what type of tile it should be
-                    canvas.blit(tile_type, (tile[0][0]*self.tile_size-camera.x, tile[0][1]*self.tile_size-camera.y))
-
-                    if tile[1] != "plant":
-                        #print(tile[0][0]*self.tile_size, tile[0][1]*self.tile_size, camera.x, camera.y, camera.player_pos[0], camera.player_pos[1])
-                        self.collision_map.append(pygame.Rect(tile[0][0]*self.tile_size, tile[0][1]*self.tile_size, self.tile_size, self.tile_size))
-                        #self.collision_map.pop(0)
+
+class LevelFile(Level):
+    def __init__(self, level_path, tile_size=16, chunk_size=8, cache_margin=2) -> None:
+        """Finite level loaded from a text file, where every line is a row of tiles
+        and every digit is a tile id (index in TILE_TYPES). Tiles are kept in a single
+        uint8 array indexed [y, x]; parsed array is cached in a .npy file next to the
+        text file and used instead of parsing as long as it's newer than the text file."""
+        super().__init__(tile_size, chunk_size, cache_margin)
+        self.tiles = self.load_tiles(level_path)
+        self.collision_grid = collision_lib.TileMapGrid(SOLID_TILES[self.tiles], tile_size)
+        self.level_size = (self.tiles.shape[1] * tile_size, self.tiles.shape[0] * tile_size)
+
+    @staticmethod
+    def parse_level(level_path):
+        """Turns text grid into an array of tile ids without looking at single characters"""
+        with open(level_path, "rb") as f:
+            rows = f.read().split()
+        if not rows or any(len(row) != len(rows[0]) for row in rows):
+            raise ValueError("{} isn't a rectangular grid of tiles".format(level_path))
+        tiles = numpy.frombuffer(b"".join(rows), dtype=numpy.uint8).reshape(len(rows), len(rows[0])) - ord("0")
+        if tiles.max() >= len(TILE_TYPES):
+            raise ValueError("{} contains unknown tile ids".format(level_path))
+        return tiles
+
+    def load_tiles(self, level_path):
+        cache_path = os.path.splitext(level_path)[0] + ".npy"
+        if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(level_path):
+            return numpy.load(cache_path)
+        tiles = self.parse_level(level_path)
+        try:
+            numpy.save(cache_path, tiles)
+        except OSError:
+            pass  # read only level directory; parse it every time
+        return tiles
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """Returns view of the tiles belonging to the chunk, empty outside of the level"""
+        # both ends clamped, a negative end would count from the other side of the level
+        first_x = max(chunk_x * self.CHUNK_SIZE, 0)
+        first_y = max(chunk_y * self.CHUNK_SIZE, 0)
+        last_x = max((chunk_x + 1) * self.CHUNK_SIZE, 0)
+        last_y = max((chunk_y + 1) * self.CHUNK_SIZE, 0)
+        return self.tiles[first_y:last_y, first_x:last_x]
+
+    def set_tile(self, tile_x, tile_y, tile_id):
+        self.tiles[tile_y, tile_x] = tile_id
+        self.collision_grid.solid[tile_y, tile_x] = SOLID_TILES[tile_id]
+        self.dirty_chunks.add((tile_x // self.CHUNK_SIZE, tile_y // self.CHUNK_SIZE))
+        self.mark_changed(tile_x // self.CHUNK_SIZE, tile_y // self.CHUNK_SIZE)
+
+    def load_chunks(self, canvas, camera, tile_images):
+        first_x, first_y, chunks_to_draw_x, chunks_to_draw_y = self.visible_chunks_range(canvas, camera)
+        for y in range(chunks_to_draw_y):
+            for x in range(chunks_to_draw_x):
+                chunk_data = self.get_chunk(x + first_x, y + first_y)
+                if chunk_data.size:
+                    self.draw_chunk(canvas, camera, x + first_x, y + first_y, chunk_data, tile_images)
+        self.evict_chunk_surfaces(first_x, first_y, first_x + chunks_to_draw_x - 1, first_y + chunks_to_draw_y - 1)
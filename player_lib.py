@@ -19,6 +19,7 @@ class Player():
         self.frame_index = 0
         self.frame_timer = 0
         self.flip = [False, False]
+        self.flipped_animations = {}
         #Sounds
         self.sounds = {}
         # Inputs
@@ -33,10 +34,12 @@ class Player():
 
     def setup_animations(self):
         for key, value in self.animation_keys.items():
-            frames = spritesheet.Spritesheet(value, (32,32), (16,16)).get_frames()
+            frames = spritesheet.get_sheet(value, (32,32), (16,16)).get_frames()
             for frame in frames:
                 frame.set_colorkey((0,0,0))
             self.animations[key] = frames
+            # mirrored copies made once here instead of flipping in every animate call
+            self.flipped_animations[key] = [pygame.transform.flip(frame, True, False) for frame in frames]
 
     def eval_inputs(self, event):
         """For every pressed or released key, check if player has an action
@@ -116,13 +119,15 @@ class Player():
             self.frame_timer = 7
         self.frame_timer -= 1
 
-        self.sprite = self.animations[self.active_animation][self.frame_index]
-        #Handling horizontal and vertical mirroring
+        #Handling horizontal mirroring
         if self.x_movement < 0:
             self.flip[0] = True
         else:
             self.flip[0] = False
-        self.sprite = pygame.transform.flip(self.sprite, self.flip[0], self.flip[1])
+        if self.flip[0]:
+            self.sprite = self.flipped_animations[self.active_animation][self.frame_index]
+        else:
+            self.sprite = self.animations[self.active_animation][self.frame_index]
         self.previous_animation = self.active_animation
 
     def update(self, tile_rects, level_size=0) -> None:
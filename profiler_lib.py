@@ -0,0 +1,75 @@
+import json, time, contextlib, pygame, numpy
+
+#Shared do-nothing span handed out while profiling is off
+NULL_SPAN = contextlib.nullcontext()
+
+
+class Span():
+    def __init__(self, profiler, name) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_sample(self.name, time.perf_counter() - self.started)
+
+
+class Profiler():
+    def __init__(self, enabled=False, window=240) -> None:
+        """Named timing spans of the frame. Last window samples of every span are
+        kept in a ring buffer, from which rolling percentiles are computed. While
+        disabled, span() only returns a shared empty context, so instrumentation
+        can stay in the main loop at nearly no cost."""
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.positions = {}
+        self.counts = {}
+        self.spans = {}
+        self.font = None
+
+    def span(self, name):
+        """Context manager timing the code inside it: with profiler.span("name"): ..."""
+        if not self.enabled:
+            return NULL_SPAN
+        span = self.spans.get(name)
+        if span is None:
+            span = self.spans[name] = Span(self, name)
+        return span
+
+    def add_sample(self, name, seconds):
+        if name not in self.samples:
+            self.samples[name] = numpy.zeros(self.window)
+            self.positions[name] = 0
+            self.counts[name] = 0
+        self.samples[name][self.positions[name]] = seconds
+        self.positions[name] = (self.positions[name] + 1) % self.window
+        self.counts[name] = min(self.counts[name] + 1, self.window)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+
+    def percentiles(self, name):
+        """p50, p95 and p99 of the span in milliseconds"""
+        samples = self.samples[name][:self.counts[name]] * 1000
+        p50, p95, p99 = numpy.percentile(samples, (50, 95, 99))
+        return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+    def report(self):
+        return {name: self.percentiles(name) for name in self.samples}
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def draw(self, surface, fps, pos=(8, 8)):
+        """Draws real FPS and percentiles of every span onto surface"""
+        if self.font is None:
+            self.font = pygame.font.Font(None, 24)
+        lines = ["FPS {:.1f}".format(fps)]
+        for name, stats in self.report().items():
+            lines.append("{:<10} p50 {:.2f}  p95 {:.2f}  p99 {:.2f} ms".format(name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]))
+        for index, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, (255, 255, 255), (0, 0, 0)), (pos[0], pos[1] + index * 20))
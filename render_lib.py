@@ -0,0 +1,173 @@
+import pygame
+
+SCALE_METHODS = ("integer", "stretch", "smooth")
+
+
+class Upscaler():
+    def __init__(self, canvas, window, method="integer") -> None:
+        """Scales canvas onto the window without making a new surface every frame.
+        integer: biggest whole multiple of canvas size that fits, centered with black bars;
+        stretch: fills the whole window; smooth: like stretch, but filtered.
+        resize() has to be called with the new display surface when the window changes."""
+        if method not in SCALE_METHODS:
+            raise ValueError("Unknown scale method {}, use one of {}".format(method, SCALE_METHODS))
+        self.canvas = canvas
+        self.method = method
+        self.resize(window)
+
+    def resize(self, window):
+        """Works out where canvas goes on the window, once per window size"""
+        self.window = window
+        canvas_width, canvas_height = self.canvas.get_size()
+        self.scale = min(window.get_width() // canvas_width, window.get_height() // canvas_height)
+        if self.method == "integer" and self.scale > 0:
+            self.target = pygame.Rect(0, 0, canvas_width * self.scale, canvas_height * self.scale)
+            self.target.center = window.get_rect().center
+        else:
+            self.target = window.get_rect()
+        # canvas is scaled straight into this part of the window; scaling into the
+        # window itself is a bit faster than into a subsurface covering all of it
+        if self.target == window.get_rect():
+            self.target_surface = window
+        else:
+            self.target_surface = window.subsurface(self.target)
+        self.integer_scale = self.method == "integer" and self.scale > 0
+        # bars around the target have to be cleared once
+        self.window_changed = True
+
+    def present(self, dirty_rects=None):
+        """Scales dirty rects of canvas onto the window, whole canvas if dirty_rects
+        is None or rects can't be scaled on their own. Returns rects of the window
+        to push to the display."""
+        if self.window_changed:
+            self.window.fill((0, 0, 0))
+            self.window_changed = False
+            self.present_whole()
+            return [self.window.get_rect()]
+        if dirty_rects is None or not self.integer_scale:
+            self.present_whole()
+            return [self.target]
+        canvas_rect = self.canvas.get_rect()
+        window_rects = []
+        for rect in dirty_rects:
+            rect = rect.clip(canvas_rect)
+            if not rect.width or not rect.height:
+                continue
+            window_rect = pygame.Rect(self.target.x + rect.x * self.scale, self.target.y + rect.y * self.scale,
+                                      rect.width * self.scale, rect.height * self.scale)
+            pygame.transform.scale(self.canvas.subsurface(rect), window_rect.size, self.window.subsurface(window_rect))
+            window_rects.append(window_rect)
+        return window_rects
+
+    def present_whole(self):
+        if self.method == "smooth":
+            pygame.transform.smoothscale(self.canvas, self.target.size, self.target_surface)
+        else:
+            pygame.transform.scale(self.canvas, self.target.size, self.target_surface)
+
+
+class DirtyRenderer():
+    def __init__(self, canvas, upscaler, sky_color=(100, 100, 255), max_rects=32) -> None:
+        """Draws frames by changing only what differs from the previous one. Tiles
+        are kept on a background surface; when the camera moves it is scrolled and only
+        strips that came into view get drawn. Entities are drawn over it on canvas and
+        only rects where something changed are scaled to the window by upscaler and
+        pushed to the display. More than max_rects dirty rects are merged into one."""
+        self.canvas = canvas
+        self.upscaler = upscaler
+        self.sky_color = sky_color
+        self.max_rects = max_rects
+        self.background = canvas.copy()
+        self.canvas_rect = canvas.get_rect()
+        # Camera view the background shows; whole pixels, so scrolling moves tiles exactly
+        self.view = None
+        # Sprites drawn last frame as (surface, canvas position) and rects they covered
+        self.blit_list = []
+        self.sprite_rects = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Next frame is drawn and presented whole, e.g. after something else drew on the window"""
+        self.full_redraw = True
+
+    def draw_background(self, level, tile_images, rect):
+        """Redraws part of the background from the level"""
+        self.background.set_clip(rect)
+        self.background.fill(self.sky_color)
+        level.load_chunks(self.background, self.view, tile_images)
+        self.background.set_clip(None)
+
+    def update_background(self, level, tile_images, camera):
+        """Moves background to the camera. Returns rects of background that changed,
+        or None when all of it did."""
+        view = camera.view_rect.copy()
+        changed = []
+        drawn_whole = False
+        if self.view is None or self.full_redraw:
+            self.view = view
+            changed = None
+            drawn_whole = True
+            self.draw_background(level, tile_images, self.canvas_rect)
+        elif view.topleft != self.view.topleft:
+            dx = view.x - self.view.x
+            dy = view.y - self.view.y
+            self.view = view
+            changed = None
+            if abs(dx) >= view.width or abs(dy) >= view.height:
+                drawn_whole = True
+                self.draw_background(level, tile_images, self.canvas_rect)
+            else:
+                self.background.scroll(-dx, -dy)
+                # strips that came into view
+                if dx > 0:
+                    self.draw_background(level, tile_images, pygame.Rect(view.width - dx, 0, dx, view.height))
+                elif dx < 0:
+                    self.draw_background(level, tile_images, pygame.Rect(0, 0, -dx, view.height))
+                if dy > 0:
+                    self.draw_background(level, tile_images, pygame.Rect(0, view.height - dy, view.width, dy))
+                elif dy < 0:
+                    self.draw_background(level, tile_images, pygame.Rect(0, 0, view.width, -dy))
+        else:
+            # nothing to draw, but the level still collects chunks finished in the background
+            self.draw_background(level, tile_images, pygame.Rect(0, 0, 0, 0))
+        # Chunks that were generated or edited since they were drawn; a whole new
+        # background already shows them
+        changed_chunks = set() if drawn_whole else set(level.changed_chunks)
+        level.changed_chunks.clear()
+        chunk_px = level.CHUNK_SIZE * level.tile_size
+        for chunk_x, chunk_y in changed_chunks:
+            chunk_rect = pygame.Rect(chunk_x * chunk_px - view.x, chunk_y * chunk_px - view.y, chunk_px, chunk_px).clip(self.canvas_rect)
+            if chunk_rect.width and chunk_rect.height:
+                self.draw_background(level, tile_images, chunk_rect)
+                if changed is not None:
+                    changed.append(chunk_rect)
+        return changed
+
+    def render(self, level, tile_images, camera, sprites):
+        """Draws level and sprites, list of (surface, (world x, world y)), onto
+        canvas. Returns rects of canvas that changed, or None when all of it did."""
+        changed = self.update_background(level, tile_images, camera)
+        blit_list = [(surface, (x - self.view.x, y - self.view.y)) for surface, (x, y) in sprites]
+        if changed is None:
+            self.canvas.blit(self.background, (0, 0))
+        else:
+            if blit_list != self.blit_list:
+                changed.extend(self.sprite_rects)
+            if not changed:
+                return []
+            for rect in changed:
+                self.canvas.blit(self.background, rect, rect)
+        self.sprite_rects = self.canvas.blits(blit_list)
+        self.blit_list = blit_list
+        self.full_redraw = False
+        if changed is None:
+            return None
+        changed.extend(self.sprite_rects)
+        if len(changed) > self.max_rects:
+            return [changed[0].unionall(changed)]
+        return changed
+
+    def present(self, dirty_rects):
+        """Scales dirty rects of canvas onto the window, whole canvas if dirty_rects
+        is None. Returns rects of the window to push to the display."""
+        return self.upscaler.present(dirty_rects)
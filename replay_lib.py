@@ -0,0 +1,77 @@
+import struct, bisect
+
+#Bit of every player input in an input mask
+INPUT_NAMES = ["jump", "squat", "left", "right", "fly_mode"]
+
+
+def pack_inputs(inputs):
+    """Turns player.inputs dict into a bit mask"""
+    mask = 0
+    for bit, name in enumerate(INPUT_NAMES):
+        if inputs[name]:
+            mask |= 1 << bit
+    return mask
+
+
+def unpack_inputs(mask, inputs):
+    """Writes a bit mask back into player.inputs dict"""
+    for bit, name in enumerate(INPUT_NAMES):
+        inputs[name] = bool(mask & (1 << bit))
+
+
+class InputLog():
+    MAGIC = b"INP2"
+    OLD_MAGIC = b"INPT"  # logs without world header, recorded with default world settings
+    WORLD = struct.Struct("<?qH")  # whether the world has a seed, seed, length of level file name
+    RECORD = struct.Struct("<IB")  # tick, input mask
+
+    def __init__(self, seed=None, level_file="") -> None:
+        """Player inputs recorded per simulation tick. Only ticks where the inputs
+        changed are stored, so a log of a long session stays tiny; input on any
+        other tick is the one of the last change before it. Seed and level file
+        of the world the inputs were recorded in are saved with them, so the log
+        can be replayed in the same world."""
+        self.seed = seed
+        self.level_file = level_file
+        self.ticks = []
+        self.masks = []
+
+    def record(self, tick, mask):
+        if not self.masks or self.masks[-1] != mask:
+            self.ticks.append(tick)
+            self.masks.append(mask)
+
+    def mask_at(self, tick):
+        index = bisect.bisect_right(self.ticks, tick) - 1
+        return self.masks[index] if index >= 0 else 0
+
+    def last_tick(self):
+        return self.ticks[-1] if self.ticks else 0
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.MAGIC)
+            level_file = self.level_file.encode("utf-8")
+            f.write(self.WORLD.pack(self.seed is not None, self.seed or 0, len(level_file)))
+            f.write(level_file)
+            for tick, mask in zip(self.ticks, self.masks):
+                f.write(self.RECORD.pack(tick, mask))
+
+    @classmethod
+    def load(cls, path):
+        input_log = cls()
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(cls.OLD_MAGIC)] == cls.OLD_MAGIC:
+            records = data[len(cls.OLD_MAGIC):]
+        elif data[:len(cls.MAGIC)] == cls.MAGIC:
+            has_seed, seed, name_length = cls.WORLD.unpack_from(data, len(cls.MAGIC))
+            start = len(cls.MAGIC) + cls.WORLD.size
+            input_log.seed = seed if has_seed else None
+            input_log.level_file = data[start:start + name_length].decode("utf-8")
+            records = data[start + name_length:]
+        else:
+            raise ValueError("{} isn't an input log".format(path))
+        for tick, mask in cls.RECORD.iter_unpack(records):
+            input_log.record(tick, mask)
+        return input_log
@@ -1,11 +1,31 @@
 import os, pygame, json
+import input_lib
 
 def set_settings(json_file):
-    """Save all the general settings to a json file"""
+    """Save all the general settings to a json file. Settings already present
+    in the file are kept, missing ones are filled with default values;
+    src_path is always updated."""
     settings_dict = {}
     settings_dict["src_path"] = os.path.dirname(os.path.realpath(__file__))
     settings_dict["window_size"] = (1600, 900)
-    with open(json_file, "r+") as f:
+    settings_dict["chunk_queue_depth"] = 16
+    settings_dict["chunk_memory_budget"] = 4 * 1024 * 1024  # bytes
+    settings_dict["level_file"] = ""  # e.g. "test_level.txt"; empty means infinite level
+    settings_dict["tick_rate"] = 60  # physics constants are tuned per tick at this rate
+    settings_dict["render"] = True
+    settings_dict["world_seed"] = None  # integer makes the infinite world reproducible
+    settings_dict["record_inputs"] = ""  # file to record player inputs to, for headless replay
+    settings_dict["render_mode"] = "dirty"  # "dirty" redraws only what changed, "full" redraws every frame
+    settings_dict["scale_method"] = "integer"  # "integer", "stretch" or "smooth", see render_lib.Upscaler
+    settings_dict["key_bindings"] = dict(input_lib.DEFAULT_BINDINGS)  # key name: action, see input_lib
+    if os.path.isfile(json_file):
+        try:
+            for k, v in get_settings(json_file).items():
+                if k != "src_path":
+                    settings_dict[k] = v
+        except ValueError:
+            pass
+    with open(json_file, "w") as f:
         json.dump(settings_dict, f, indent=4)
 
 
@@ -48,3 +68,4 @@ def load_images(src_dir, images_dir=None):
             image_dict[img_name] = pygame.image.load(img)
             image_dict[img_name].set_colorkey((0,0,0))
     return image_dict
+
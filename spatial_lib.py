@@ -0,0 +1,94 @@
+import pygame
+
+
+class SpatialHash():
+    def __init__(self, cell_size=64) -> None:
+        """Broad phase for entity vs entity queries. World is split into square cells
+        and every registered object (anything with a rect) is listed in each cell its
+        rect overlaps, so queries only look at objects in nearby cells. Objects are
+        moved between cells only when their rect crosses a cell border."""
+        self.cell_size = cell_size
+        self.cells = {}
+        self.spans = {}
+
+    def cell_span(self, rect):
+        """First and last cell overlapped by rect in each axis"""
+        return (rect.left // self.cell_size, rect.top // self.cell_size,
+                (rect.right - 1) // self.cell_size, (rect.bottom - 1) // self.cell_size)
+
+    def add_to_cells(self, obj, span):
+        for cell_y in range(span[1], span[3] + 1):
+            for cell_x in range(span[0], span[2] + 1):
+                self.cells.setdefault((cell_x, cell_y), set()).add(obj)
+
+    def remove_from_cells(self, obj, span):
+        for cell_y in range(span[1], span[3] + 1):
+            for cell_x in range(span[0], span[2] + 1):
+                cell = self.cells[(cell_x, cell_y)]
+                cell.discard(obj)
+                if not cell:
+                    del self.cells[(cell_x, cell_y)]
+
+    def insert(self, obj):
+        span = self.cell_span(obj.rect)
+        self.spans[obj] = span
+        self.add_to_cells(obj, span)
+
+    def remove(self, obj):
+        span = self.spans.pop(obj, None)
+        if span is not None:
+            self.remove_from_cells(obj, span)
+
+    def move(self, obj):
+        """Call after obj.rect changed; does nothing unless it crossed into other cells"""
+        span = self.cell_span(obj.rect)
+        old_span = self.spans[obj]
+        if span != old_span:
+            self.remove_from_cells(obj, old_span)
+            self.add_to_cells(obj, span)
+            self.spans[obj] = span
+
+    def __contains__(self, obj):
+        return obj in self.spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def candidates(self, rect):
+        """Every object listed in cells overlapped by rect, without exact test"""
+        found = set()
+        first_x, first_y, last_x, last_y = self.cell_span(rect)
+        for cell_y in range(first_y, last_y + 1):
+            for cell_x in range(first_x, last_x + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell:
+                    found |= cell
+        return found
+
+    def query_rect(self, rect):
+        """Objects whose rects overlap rect"""
+        return [obj for obj in self.candidates(rect) if obj.rect.colliderect(rect)]
+
+    def query_radius(self, pos, radius):
+        """Objects whose rect has at least one point within radius of pos"""
+        bounds = pygame.Rect(pos[0] - radius, pos[1] - radius, radius * 2 + 1, radius * 2 + 1)
+        found = []
+        for obj in self.candidates(bounds):
+            closest_x = min(max(pos[0], obj.rect.left), obj.rect.right - 1)
+            closest_y = min(max(pos[1], obj.rect.top), obj.rect.bottom - 1)
+            if (closest_x - pos[0])**2 + (closest_y - pos[1])**2 <= radius**2:
+                found.append(obj)
+        return found
+
+    def pairs(self):
+        """Every pair of objects with overlapping rects, each pair reported once"""
+        found = set()
+        for cell in self.cells.values():
+            if len(cell) < 2:
+                continue
+            cell_objects = list(cell)
+            for index, obj in enumerate(cell_objects):
+                for other in cell_objects[index + 1:]:
+                    if obj.rect.colliderect(other.rect):
+                        found.add((obj, other) if id(obj) < id(other) else (other, obj))
+        return found
@@ -1,63 +1,63 @@
-import pygame
+import pygame, weakref
+
+# Sheets already sliced, per image and grid, so entities sharing an image share its frames
+sheet_cache = weakref.WeakKeyDictionary()
+
+
+def get_sheet(img, res, frame_size):
+    """Returns the Spritesheet for img sliced into frame_size frames, slicing it
+    only the first time it's asked for"""
+    sheets = sheet_cache.setdefault(img, {})
+    key = (tuple(res), tuple(frame_size))
+    if key not in sheets:
+        sheets[key] = Spritesheet(img, res, frame_size)
+    return sheets[key]
+
 
 class Spritesheet():
     def __init__(self, img, res, frame_size) -> None:
         """Sprite sheet object. Contains an image and grid, evaluated from
-        image size and frame size."""
+        image size and frame size. Frames are subsurfaces of the image, made once
+        here, numbered left to right, row after row."""
         #self.surf = pygame.image.load(img).convert()
         self.surf = img
         self.surf.set_colorkey((0,0,0))
         self.res = res
         self.frame_size = frame_size
+        #Image size has to be divisible by single frame size
+        if res[0] % frame_size[0] or res[1] % frame_size[1]:
+            raise ValueError(f"Sprite sheet resolution {res} isn't divisible by frame size {frame_size}")
+        self.frames_x = res[0] // frame_size[0]
+        self.frames_y = res[1] // frame_size[1]
+        self.frame_rects = [pygame.Rect(x * frame_size[0], y * frame_size[1], frame_size[0], frame_size[1])
+                            for y in range(self.frames_y) for x in range(self.frames_x)]
+        #frames are views into the sheet (and the atlas the sheet lives in), not copies
+        self.frames = [self.surf.subsurface(rect) for rect in self.frame_rects]
+        # Mirrored copies of frames per colorkey, see oriented_frames
+        self.oriented = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame(self, index):
+        return self.frames[index]
 
     def get_frames(self, frame_amount=0, starting_point=0):
-        """Creates a grid upon an image transformed into a pygame.Surface object. For
-        each square/rectangle in grid, takes the square/rectangle and puts its contents
-        into a new surface. Returns list of these surfaces. Frame amount lets you specify how many
-        consecuting regions in x,y grid you want to be included in frames. Starting
-        point is the first region included in list of grid elements you want to get."""
-        #How many frames to include
-        if frame_amount != 0:
-            frame_amount = frame_amount
-        else:
-            frame_amount = self.res[0] / self.frame_size[0] * self.res[1] / self.frame_size[1]      
-        #Returns an error if image size isn't divisible by single frame size
-        if (self.res[0] / self.frame_size[0]).is_integer() and (self.res[1] / self.frame_size[1]).is_integer():
-            frames_x = self.res[0] // self.frame_size[0]
-            frames_y = self.res[1] // self.frame_size[1]
-        else:
-            print("The image resolution isn't divisible by frame frame_size")
-            return
-        #Which element in grid will be included as first.
-        start_point = starting_point
-        starting_x = 0
-        starting_y = 0
-        while starting_point > 0:
-            if starting_point > frames_x:
-                starting_y += 1
-                starting_point -= frames_x
-
-            starting_x += 1
-            starting_point -= 1
-
-        frame_list = [] #list of new surfaces
-        #scan the grid and copy each fragment
-        for y in range(0, frames_y):
-            for x in range(0, frames_x):
-                #Ending condition. x = elements in row; y*frames_x = elements in previous rows
-                if x + y * frames_x == frame_amount + start_point:
-                    return frame_list
-
-                frame_x = (x + starting_x)
-                frame_y = (y + starting_y)
-                #print(frame_y, frame_x)
-                if frame_x == frames_x:
-                    starting_x = 0
-                    break
-                if frame_y == frames_y:
-                    break
-
-                new_surf = pygame.Surface((self.frame_size[0], self.frame_size[1])) #creates surface to contain the frame
-                new_surf.blit(self.surf, (-frame_x*self.frame_size[0],-frame_y*self.frame_size[1])) #puts current part of image in the frame
-                frame_list.append(new_surf)
-        return frame_list
+        """Returns list of frame_amount frames beginning with frame number
+        starting_point, or every frame from starting_point when frame_amount is 0."""
+        if frame_amount == 0:
+            return self.frames[starting_point:]
+        return self.frames[starting_point:starting_point + frame_amount]
+
+    def oriented_frames(self, colorkey):
+        """Standalone copies of every frame in every orientation, indexed [flip x][flip y],
+        with RLE colorkey; they blit faster than subsurfaces. Made once per colorkey."""
+        colorkey = tuple(colorkey)
+        if colorkey not in self.oriented:
+            self.oriented[colorkey] = oriented = [[None, None], [None, None]]
+            for flip_x in (False, True):
+                for flip_y in (False, True):
+                    oriented[flip_x][flip_y] = [pygame.transform.flip(frame, flip_x, flip_y) for frame in self.frames]
+                    for frame in oriented[flip_x][flip_y]:
+                        frame.set_colorkey(colorkey, pygame.RLEACCEL)
+        return self.oriented[colorkey]
@@ -0,0 +1,74 @@
+import os, mmap, struct, numpy
+
+class ChunkStore():
+    MAGIC = b"CHNK"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHH?Q")  # magic, format version, chunk size, whether the world has a seed, seed
+    KEY = struct.Struct("<ii")  # chunk x, chunk y
+
+    def __init__(self, path, chunk_size=8, seed=None) -> None:
+        """Region file holding chunks as fixed size records: chunk coordinates
+        followed by chunk_size*chunk_size tile ids. Records are looked up through an
+        index built when the file is opened and read back through mmap, so only
+        the chunks that are asked for are ever touched. A chunk written again
+        overwrites its record in place. Stored chunks are edits of the world
+        generated with seed, so a file of another world is refused."""
+        self.path = path
+        self.chunk_size = chunk_size
+        self.record_size = self.KEY.size + chunk_size * chunk_size
+        self.index = {}
+        # same as WorldGenerator, seed is kept as a non negative number
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, chunk_size, seed is not None, 0 if seed is None else seed % 2**64)
+        if not os.path.isfile(path) or os.path.getsize(path) < self.HEADER.size:
+            with open(path, "wb") as f:
+                f.write(header)
+        self.file = open(path, "r+b")
+        stored_header = self.file.read(self.HEADER.size)
+        if stored_header != header:
+            self.file.close()
+            magic, version, stored_chunk_size, has_seed, stored_seed = self.HEADER.unpack(stored_header)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("{} isn't a chunk store of version {}".format(path, self.VERSION))
+            if stored_chunk_size != chunk_size:
+                raise ValueError("{} isn't a chunk store for chunk size {}".format(path, chunk_size))
+            raise ValueError("{} holds chunks of world seed {}, not {}".format(path, stored_seed if has_seed else None, seed))
+        self.map = None
+        self.remap()
+        for offset in range(self.HEADER.size, len(self.map) - self.record_size + 1, self.record_size):
+            self.index[self.KEY.unpack_from(self.map, offset)] = offset
+
+    def remap(self):
+        """Maps the file again after it grew"""
+        if self.map is not None:
+            self.map.close()
+        self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, coords):
+        return coords in self.index
+
+    def load(self, chunk_x, chunk_y):
+        """Returns a copy of the stored chunk array or None if chunk was never stored"""
+        offset = self.index.get((chunk_x, chunk_y))
+        if offset is None:
+            return None
+        if offset + self.record_size > len(self.map):
+            self.remap()
+        tiles = numpy.frombuffer(self.map, dtype=numpy.uint8, count=self.chunk_size * self.chunk_size, offset=offset + self.KEY.size)
+        return tiles.reshape(self.chunk_size, self.chunk_size).copy()
+
+    def save(self, chunk_x, chunk_y, chunk_data):
+        offset = self.index.get((chunk_x, chunk_y))
+        if offset is None:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.index[(chunk_x, chunk_y)] = offset
+        self.file.seek(offset)
+        self.file.write(self.KEY.pack(chunk_x, chunk_y))
+        self.file.write(numpy.ascontiguousarray(chunk_data, dtype=numpy.uint8).tobytes())
+        # load() reads through the map, which only sees what reached the file
+        self.file.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
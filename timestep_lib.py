@@ -0,0 +1,32 @@
+class FixedTimestep():
+    def __init__(self, tick_rate=60, max_ticks=5, realtime=True) -> None:
+        """Decouples simulation from rendering. Time of every rendered frame is
+        added to an accumulator, which is spent in simulation ticks of fixed length,
+        so the game runs at the same speed no matter the frame rate. Leftover time
+        gives alpha - how far between the last two ticks the rendered frame is.
+        At most max_ticks run per frame, so a slow frame can't snowball. When
+        realtime is False every frame runs exactly one tick, letting simulation
+        run as fast as the machine allows."""
+        self.tick_rate = tick_rate
+        self.tick_length = 1 / tick_rate
+        self.max_ticks = max_ticks
+        self.realtime = realtime
+        self.accumulator = 0.0
+        self.tick_count = 0
+
+    def advance(self, frame_time):
+        """Adds frame_time (seconds) to the accumulator and returns how many ticks to run"""
+        if not self.realtime:
+            self.tick_count += 1
+            return 1
+        self.accumulator = min(self.accumulator + frame_time, self.tick_length * self.max_ticks)
+        ticks = int(self.accumulator // self.tick_length)
+        self.accumulator -= ticks * self.tick_length
+        self.tick_count += ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        if not self.realtime:
+            return 1.0
+        return self.accumulator / self.tick_length
@@ -0,0 +1,83 @@
+import hashlib, struct, numpy
+import entity, spatial_lib, replay_lib, profiler_lib
+
+
+class World():
+    def __init__(self, level, player_images, enemy_images, player_pos=(300, 100), enemy_positions=((200, 100),)) -> None:
+        """Everything that is simulated - level, player and enemies - without any
+        display, sound or event handling, so it can be stepped by the game loop
+        as well as headless. Every call of tick() advances it by one fixed tick."""
+        self.level = level
+        # Setting up the player object
+        self.player = entity.Player(player_pos, player_images, speed=3)
+        self.player.setup_animations()
+        # Broad phase for entity vs entity queries; holds the player and every enemy, as entity.SwarmEnemy
+        self.entity_hash = spatial_lib.SpatialHash()
+        self.player.register(self.entity_hash)
+        #Setting up other entities; all enemies are simulated together by the swarm
+        self.enemies = entity.EnemySwarm(enemy_images, frame_size=(32,32), tile_size=level.tile_size)
+        for pos in enemy_positions:
+            self.enemies.spawn(pos)
+        self.enemies.register(self.entity_hash)
+        self.animated_entities = [self.player]
+        self.tick_count = 0
+        # Rect of the world entities are animated in, e.g. camera view; everything is animated if None
+        self.view = None
+        # Replaced by the game's profiler to time stages of the tick
+        self.profiler = profiler_lib.Profiler(enabled=False)
+
+    def tick(self, input_mask=None):
+        """Advances simulation by one tick; input_mask (see replay_lib) replaces
+        player inputs, otherwise they stay as they were"""
+        if input_mask is not None:
+            replay_lib.unpack_inputs(input_mask, self.player.inputs)
+        with self.profiler.span("update"):
+            self.update_entities()
+        with self.profiler.span("animate"):
+            self.animate_entities()
+        self.tick_count += 1
+
+    def update_entities(self):
+        """Movement and collisions of every entity"""
+        # chunks needed this tick; the level may evict any other ones
+        needed_chunks = set()
+        for anim_entity in self.animated_entities:
+            # chunks the entity can sweep through this tick, judging by its last movement
+            reach = anim_entity.rect.inflate(abs(anim_entity.x_movement) * 4, abs(anim_entity.y_movement) * 4)
+            needed_chunks |= self.level.ensure_chunks(reach)
+            anim_entity.update(collision_grid=self.level.collision_grid, player=self.player, level_size=self.level.level_size)
+        if len(self.enemies):
+            # chunks enemies can move through, as above; enemies must not depend on chunks loaded for drawing
+            enemies = self.enemies
+            reach_x = numpy.abs(enemies.x_movement) * 2
+            reach_y = numpy.abs(enemies.y_movement) * 2
+            needed_chunks |= self.level.ensure_chunks_many(numpy.floor(enemies.x - reach_x), numpy.floor(enemies.y - reach_y),
+                                          numpy.ceil(enemies.x + enemies.width + reach_x), numpy.ceil(enemies.y + enemies.height + reach_y))
+        self.enemies.update(collision_grid=self.level.collision_grid, player=self.player, level_size=self.level.level_size)
+        self.level.retain_chunks(needed_chunks)
+
+    def animate_entities(self):
+        """Animation of entities in view; those out of it stay on their frame"""
+        if self.view is None:
+            for anim_entity in self.animated_entities:
+                anim_entity.animate()
+            self.enemies.animate()
+            return
+        for anim_entity in self.animated_entities:
+            if self.view.colliderect(anim_entity.rect):
+                anim_entity.animate()
+        self.enemies.animate(self.enemies.overlapping(self.view))
+
+    def state_hash(self):
+        """Hash of the simulated state; two runs with the same seed and inputs
+        have to end with the same hash"""
+        state = hashlib.sha256()
+        player = self.player
+        state.update(struct.pack("<qqqddddi", self.tick_count, player.rect.x, player.rect.y, player.pos_x, player.pos_y,
+                                 player.momentum, player.y_movement, player.jump_ability))
+        state.update(self.enemies.x.tobytes())
+        state.update(self.enemies.y.tobytes())
+        state.update(self.enemies.pos_x.tobytes())
+        state.update(self.enemies.pos_y.tobytes())
+        state.update(self.enemies.frame_index.tobytes())
+        return state.hexdigest()